@@ -72,6 +72,12 @@ class Settings(BaseSettings):
     # ========== Configuración de pgvector ==========
     VECTOR_DIMENSION: int = 768  # Dimensión de los embeddings (depende del modelo de NLP)
     SIMILARITY_THRESHOLD: float = 0.7  # Umbral de similitud para búsquedas semánticas
+    # Candidatos explorados por el índice HNSW en cada consulta KNN. El default
+    # de pgvector (40) se queda corto: el híbrido pide limite * 3 = 30 vecinos y
+    # los filtros (eventos futuros, no vistos) descartan candidatos después del
+    # índice, así que con 40 la consulta suele devolver menos filas de las pedidas.
+    HNSW_EF_SEARCH: int = 100
+    DB_FANOUT_MAX: int = 8  # Sesiones extra simultáneas para consultas en paralelo (híbrido)
 
     # ========== Configuración de NLP ==========
     NLP_MODEL_NAME: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
@@ -5,12 +5,34 @@ Provee el engine SQLAlchemy y la dependencia de sesión para FastAPI.
 
 from collections.abc import AsyncGenerator
 
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 from app.config import settings
 
 engine = create_async_engine(settings.ASYNC_DATABASE_URL, echo=settings.DEBUG)
 
+
+@event.listens_for(engine.sync_engine, "connect")
+def _configurar_hnsw(dbapi_connection, connection_record) -> None:
+    """
+    Fija ``hnsw.ef_search`` en cada conexión nueva del pool.
+
+    Las búsquedas KNN ordenadas por ``<=>`` usan el índice HNSW
+    ``ix_events_embedding``; este parámetro acota cuántos candidatos
+    explora por consulta (más alto = mejor recall, más lento).
+
+    El ``SET`` se ejecuta en autocommit: dentro de la transacción implícita
+    del adaptador, el rollback del pool al devolver la conexión lo desharía.
+    """
+    autocommit_previo = dbapi_connection.autocommit
+    dbapi_connection.autocommit = True
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"SET hnsw.ef_search = {int(settings.HNSW_EF_SEARCH)}")
+    cursor.close()
+    dbapi_connection.autocommit = autocommit_previo
+
+
 AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
@@ -18,3 +40,13 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """Dependencia FastAPI que provee una sesión de base de datos."""
     async with AsyncSessionLocal() as session:
         yield session
+
+
+def get_session_factory() -> async_sessionmaker[AsyncSession] | None:
+    """
+    Dependencia FastAPI que provee la fábrica de sesiones extra.
+
+    La usan los servicios que abren una segunda sesión para consultar en
+    paralelo. Con ``None`` trabajan en secuencia sobre la sesión de ``get_db``.
+    """
+    return AsyncSessionLocal
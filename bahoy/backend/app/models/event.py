@@ -8,7 +8,7 @@ import uuid
 from datetime import datetime
 from decimal import Decimal
 
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import HALFVEC, Vector
 from sqlalchemy import (
     Boolean,
     DateTime,
@@ -17,6 +17,7 @@ from sqlalchemy import (
     Numeric,
     String,
     Text,
+    cast,
 )
 from sqlalchemy.dialects.postgresql import ARRAY, UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
@@ -170,16 +171,25 @@ class Event(Base, UUIDMixin, TimestampMixin):
         Index("ix_events_fecha_rango", "fecha_inicio", "fecha_fin"),
         # Índice GIN para búsquedas en el array de tags
         Index("ix_events_tags", "tags", postgresql_using="gin"),
-        # Índice vectorial HNSW para búsqueda de vecinos cercanos en el embedding.
-        # Usa distancia coseno para comparar similitud semántica entre eventos.
-        Index(
-            "ix_events_embedding",
-            "embedding",
-            postgresql_using="hnsw",
-            postgresql_with={"m": 16, "ef_construction": 64},
-            postgresql_ops={"embedding": "vector_cosine_ops"},
-        ),
     )
 
     def __repr__(self) -> str:
         return f"<Event(id={self.id}, titulo='{self.titulo[:50]}...')>"
+
+
+# Embedding en media precisión (halfvec, float16). El orden por similitud no
+# necesita float32: el índice ocupa la mitad y cada distancia lee la mitad de
+# bytes. La columna sigue siendo float32; las consultas de vecinos deben
+# ordenar por esta misma expresión para que el planner use el índice.
+EMBEDDING_HALFVEC = cast(Event.embedding, HALFVEC(EMBEDDING_DIMENSION))
+
+# Índice vectorial HNSW para búsqueda de vecinos cercanos en el embedding.
+# Usa distancia coseno para comparar similitud semántica entre eventos.
+# Las bases existentes se migran con scripts/upgrade-halfvec-index.sql.
+Index(
+    "ix_events_embedding",
+    EMBEDDING_HALFVEC.label("embedding"),
+    postgresql_using="hnsw",
+    postgresql_with={"m": 16, "ef_construction": 64},
+    postgresql_ops={"embedding": "halfvec_cosine_ops"},
+)
@@ -228,15 +228,40 @@ def _clasificar_por_reglas(titulo: str, descripcion: str) -> Optional[dict]:
 # Capa 2: Clasificación por embeddings
 # ---------------------------------------------------------------------------
 
-def _similitud_coseno(vec_a, vec_b) -> float:
-    """Similitud coseno entre dos vectores numpy."""
+def _vector_unitario(vec):
+    """Normaliza `vec` a norma 1 (un vector nulo se devuelve como ceros)."""
     import numpy as np  # noqa: PLC0415
 
-    norma_a = np.linalg.norm(vec_a)
-    norma_b = np.linalg.norm(vec_b)
-    if norma_a == 0 or norma_b == 0:
-        return 0.0
-    return float(np.dot(vec_a, vec_b) / (norma_a * norma_b))
+    vec = np.asarray(vec, dtype=np.float32)
+    norma = np.linalg.norm(vec)
+    return vec / norma if norma else np.zeros_like(vec)
+
+
+# Matriz (N, D) de embeddings unitarios de DESCRIPCIONES_TIPICAS, en el orden
+# de sus claves. Las descripciones son constantes: se encodean una sola vez y
+# cada clasificación se reduce a un producto matriz-vector.
+_matriz_categorias = None
+
+
+def _get_matriz_categorias():
+    """Construye (una única vez) la matriz de embeddings de categorías."""
+    global _matriz_categorias
+    if _matriz_categorias is None:
+        import numpy as np  # noqa: PLC0415
+
+        modelo = _get_modelo()
+        matriz = np.stack(
+            [
+                np.asarray(modelo.encode(descripcion), dtype=np.float32)
+                for descripcion in DESCRIPCIONES_TIPICAS.values()
+            ]
+        )
+        # Las filas de norma cero ya son todo ceros: se dejan como están.
+        normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+        np.divide(matriz, normas, out=matriz, where=normas > 0)
+        matriz.setflags(write=False)
+        _matriz_categorias = matriz
+    return _matriz_categorias
 
 
 def _clasificar_por_embeddings(titulo: str, descripcion: str) -> dict:
@@ -245,20 +270,27 @@ def _clasificar_por_embeddings(titulo: str, descripcion: str) -> dict:
 
     Siempre devuelve un resultado (fallback definitivo).
     """
+    import numpy as np  # noqa: PLC0415
+
     modelo = _get_modelo()
     texto_evento = titulo + " " + descripcion
 
-    embedding_evento = modelo.encode(texto_evento)
-
-    mejor_cat = "Festivales"  # fallback por defecto
-    mejor_similitud = -1.0
-
-    for categoria, descripcion_tipica in DESCRIPCIONES_TIPICAS.items():
-        embedding_cat = modelo.encode(descripcion_tipica)
-        sim = _similitud_coseno(embedding_evento, embedding_cat)
-        if sim > mejor_similitud:
-            mejor_similitud = sim
-            mejor_cat = categoria
+    embedding_evento = _vector_unitario(modelo.encode(texto_evento))
+
+    # Puntuar todas las categorías con un único producto matriz-vector contra
+    # la matriz precalculada.
+    categorias = list(DESCRIPCIONES_TIPICAS)
+    similitudes = _get_matriz_categorias() @ embedding_evento
+
+    # argmax devuelve la primera categoría con el máximo, igual que el
+    # recorrido secuencial; si ninguna supera -1 se mantiene el fallback.
+    mejor = int(np.argmax(similitudes))
+    mejor_similitud = float(similitudes[mejor])
+    if mejor_similitud > -1.0:
+        mejor_cat = categorias[mejor]
+    else:
+        mejor_cat = "Festivales"  # fallback por defecto
+        mejor_similitud = -1.0
 
     return {
         "categoria": mejor_cat,
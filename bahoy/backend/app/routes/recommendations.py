@@ -7,9 +7,9 @@ import uuid
 from typing import Any, Literal
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from app.database import get_db
+from app.database import get_db, get_session_factory
 from app.services.recommender import RecommenderService
 
 router = APIRouter(prefix="/recommendations", tags=["recommendations"])
@@ -33,6 +33,9 @@ async def get_recommendations(
         description="Número de resultados a devolver",
     ),
     db: AsyncSession = Depends(get_db),
+    session_factory: async_sessionmaker[AsyncSession] | None = Depends(
+        get_session_factory
+    ),
 ) -> list[dict[str, Any]]:
     """
     Obtiene recomendaciones de eventos para el usuario.
@@ -56,7 +59,7 @@ async def get_recommendations(
     }
     ```
     """
-    service = RecommenderService(db)
+    service = RecommenderService(db, session_factory=session_factory)
 
     if tipo == "similares":
         if not event_id:
@@ -15,6 +15,7 @@ from sqlalchemy.orm import selectinload
 from app.database import get_db
 from app.models.interaction import Interaction, InteractionType
 from app.models.user import User
+from app.services.recommender import invalidar_perfil, invalidar_preferencias
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -140,6 +141,7 @@ async def save_preferences(
     user.preferencias = existing_prefs
 
     await db.commit()
+    invalidar_preferencias(user.id)
     await db.refresh(user)
     return {"user_id": user.id, "preferencias": user.preferencias}
 
@@ -188,6 +190,7 @@ async def register_interaction(
     )
     db.add(interaction)
     await db.commit()
+    invalidar_perfil(user_id)
     await db.refresh(interaction)
     return interaction
 
@@ -6,22 +6,32 @@ Fase 1: Filtrado explícito por preferencias declaradas del usuario.
 Fase 2: Recomendación basada en contenido (comportamiento implícito + embeddings).
 """
 
+import asyncio
+import inspect
+import logging
+import re
 import uuid
-from collections import Counter
-from datetime import datetime, time, timedelta, timezone
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache, wraps
+from time import monotonic
 from typing import Any
 
 import numpy as np
-from sqlalchemy import func, or_, select
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy import RowMapping, Select, func, or_, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import defer, selectinload
 
+from app.config import settings
 from app.models.category import Category
-from app.models.event import Event
+from app.models.event import EMBEDDING_HALFVEC, Event
 from app.models.interaction import Interaction, InteractionType
 from app.models.user import User
 from app.models.venue import Venue
 
+logger = logging.getLogger(__name__)
+
 # Pesos de interacción para el cálculo del perfil implícito (Fase 2).
 # Refleja el grado de intención: guardar > hacer clic > ver.
 _PESOS_CONTENIDO: dict[InteractionType, float] = {
@@ -32,6 +42,284 @@ _PESOS_CONTENIDO: dict[InteractionType, float] = {
     InteractionType.VISTA: 1.0,
 }
 
+# Columnas que consume ``_serializar_fila``. Los listados que solo serializan
+# (similares y contexto) las leen como filas Core con un único LEFT JOIN, sin
+# hidratar entidades ORM ni disparar los SELECT extra de ``selectinload``.
+_COLUMNAS_EVENTO = (
+    Event.id,
+    Event.titulo,
+    Event.descripcion,
+    Category.nombre.label("categoria"),
+    Event.subcategorias,
+    Event.fecha_inicio,
+    Event.fecha_fin,
+    Venue.id.label("venue_id"),
+    Venue.nombre.label("venue_nombre"),
+    Venue.barrio.label("venue_barrio"),
+    Venue.direccion.label("venue_direccion"),
+    Event.precio_min,
+    Event.precio_max,
+    Event.es_gratuito,
+    Event.imagen_url,
+    Event.url_fuente,
+    Event.tags,
+)
+
+
+def _select_filas_evento() -> Select:
+    """SELECT de ``_COLUMNAS_EVENTO`` con categoría y venue unidos por LEFT JOIN."""
+    return (
+        select(*_COLUMNAS_EVENTO)
+        .select_from(Event)
+        .outerjoin(Category, Event.categoria_id == Category.id)
+        .outerjoin(Venue, Event.venue_id == Venue.id)
+    )
+
+
+# Opciones de carga de los eventos candidato. El embedding (384 floats por
+# fila) solo lo usa PostgreSQL para ordenar: no se transfiere ni se hidrata, y
+# ``raiseload`` hace fallar en lugar de disparar una carga perezosa si algún
+# código lo llegara a leer.
+_OPCIONES_CANDIDATO = (
+    selectinload(Event.venue),
+    selectinload(Event.categoria),
+    defer(Event.embedding, raiseload=True),
+)
+
+
+# Pesos de relevancia de Fase 1, alineados con las columnas de la matriz de
+# rasgos que arma ``_rasgos_evento``: el puntaje es ``rasgos @ pesos``.
+_PESOS_RELEVANCIA = np.array(
+    [
+        5.0,  # categoría favorita
+        3.0,  # barrio preferido
+        2.0,  # gratuito o precio dentro del rango (si hay filtro de precio)
+        1.5,  # por cada tag de interés coincidente
+        2.0,  # proximidad ≤3 días
+        1.0,  # proximidad ≤7 días
+    ],
+    dtype=np.float32,
+)
+_PESOS_RELEVANCIA.setflags(write=False)
+
+# Palabras clave de ``recomendar_por_contexto``: una sola alternancia con un
+# grupo nombrado por filtro, recorrida una vez por consulta. Coincide por
+# subcadena, igual que ``in`` ("familia" cubre también "familiar").
+_PATRON_CONTEXTO = re.compile(
+    r"(?P<gratis>gratis|gratuito|free)"
+    r"|(?P<ninos>niños|ninos|familia|kids|infantil)"
+    r"|(?P<noche>noche)"
+    r"|(?P<hoy>hoy)"
+    r"|(?P<finde>fin de semana|finde|weekend)"
+)
+
+
+@lru_cache(maxsize=1)
+def _rangos_del_dia(hoy: date) -> dict[str, tuple[datetime, datetime]]:
+    """
+    Límites UTC de "esta noche", "hoy" y "fin de semana" para la fecha ``hoy``.
+    Solo dependen de la fecha: se calculan una vez por día, no por consulta.
+    """
+    inicio_dia = datetime.combine(hoy, time(0, 0), tzinfo=timezone.utc)
+    sabado = inicio_dia + timedelta(days=(5 - hoy.weekday()) % 7 or 7)
+    return {
+        "noche": (
+            datetime.combine(hoy, time(19, 0), tzinfo=timezone.utc),
+            datetime.combine(hoy, time(23, 59), tzinfo=timezone.utc),
+        ),
+        "hoy": (
+            inicio_dia,
+            datetime.combine(hoy, time(23, 59, 59), tzinfo=timezone.utc),
+        ),
+        "finde": (sabado, sabado + timedelta(days=1, hours=23, minutes=59, seconds=59)),
+    }
+
+
+# Filas por lote al leer con cursor del servidor las interacciones agrupadas
+# de ``recomendar_populares``.
+_LOTE_POPULARIDAD = 1000
+
+# Permisos para abrir sesiones extra y paralelizar la Fase 2 del híbrido.
+# Acota cuántas conexiones adicionales del pool se toman a la vez: sin permiso
+# libre, las fases corren en secuencia sobre la sesión del pedido.
+_SESIONES_EXTRA = asyncio.Semaphore(settings.DB_FANOUT_MAX)
+
+
+class _CacheTTL:
+    """
+    Caché LRU en proceso, por clave de texto, con vencimiento por entrada.
+    Las claves son user_id normalizados o, para el respaldo de resultados,
+    el método y sus argumentos. El worker que atiende una escritura invalida
+    al instante; en el resto el TTL acota cuánto puede quedar desactualizada
+    una entrada.
+    """
+
+    __slots__ = ("_ttl", "_max_entradas", "_entradas")
+
+    def __init__(self, ttl: float, max_entradas: int) -> None:
+        self._ttl = ttl
+        self._max_entradas = max_entradas
+        self._entradas: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, clave: str) -> Any | None:
+        """Valor vigente para ``clave``, o None si falta o ya venció."""
+        entrada = self._entradas.get(clave)
+        if entrada is None or entrada[0] <= monotonic():
+            return None
+        self._entradas.move_to_end(clave)
+        return entrada[1]
+
+    def put(self, clave: str, valor: Any) -> None:
+        self._entradas[clave] = (monotonic() + self._ttl, valor)
+        self._entradas.move_to_end(clave)
+        if len(self._entradas) > self._max_entradas:
+            self._entradas.popitem(last=False)
+
+    def invalidar(self, clave: str) -> None:
+        self._entradas.pop(clave, None)
+
+    def clear(self) -> None:
+        self._entradas.clear()
+
+
+# Preferencias declaradas (Fase 1) e historial de contenido (Fase 2): IDs
+# interactuados y perfil ponderado, que cambian solo al escribir el usuario.
+_cache_preferencias = _CacheTTL(ttl=30.0, max_entradas=10_000)
+_cache_perfiles = _CacheTTL(ttl=30.0, max_entradas=10_000)
+
+
+# Último resultado bueno de las búsquedas vectoriales, por método y argumentos.
+# Se sirve solo si la siguiente consulta falla por la base (caída o timeout).
+_ultimos_resultados = _CacheTTL(ttl=300.0, max_entradas=1024)
+
+# Fallas de infraestructura que habilitan el respaldo; los errores de SQL o de
+# programación se propagan siempre.
+_ERRORES_DE_BASE = (OperationalError, TimeoutError, ConnectionError)
+
+
+def _con_respaldo(metodo):
+    """
+    Decora un ``recomendar_*`` que depende del índice vectorial: guarda cada
+    resultado exitoso y, si la base falla, devuelve el último resultado bueno
+    para los mismos argumentos. Sin uno guardado, la excepción se propaga.
+    """
+    firma = inspect.signature(metodo)
+
+    @wraps(metodo)
+    async def envoltura(self, *args: Any, **kwargs: Any) -> list[dict[str, Any]]:
+        argumentos = firma.bind(self, *args, **kwargs)
+        argumentos.apply_defaults()
+        # Los IDs se normalizan como en las demás cachés: el mismo UUID como
+        # objeto o en otra capitalización comparte la entrada.
+        valores = [
+            str(uuid.UUID(str(valor))) if nombre.endswith("_id") else valor
+            for nombre, valor in list(argumentos.arguments.items())[1:]
+        ]
+        clave = repr((metodo.__name__, *valores))
+        try:
+            resultado = await metodo(self, *args, **kwargs)
+        except _ERRORES_DE_BASE:
+            respaldo = _ultimos_resultados.get(clave)
+            if respaldo is None:
+                raise
+            logger.warning("%s: base no disponible, se sirve el último resultado", clave)
+            return respaldo
+        _ultimos_resultados.put(clave, resultado)
+        return resultado
+
+    return envoltura
+
+
+def invalidar_preferencias(user_id: Any) -> None:
+    """Descarta las preferencias cacheadas de un usuario tras modificarlas."""
+    _cache_preferencias.invalidar(str(user_id))
+
+
+def invalidar_perfil(user_id: Any) -> None:
+    """Descarta el perfil de contenido cacheado tras registrar una interacción."""
+    _cache_perfiles.invalidar(str(user_id))
+
+
+def _pesos_por_tipo(tipos: list[Any]) -> np.ndarray:
+    """Pesos float32 de ``_PESOS_CONTENIDO`` para cada tipo (1.0 si no figura)."""
+    return np.fromiter(
+        (_PESOS_CONTENIDO.get(tipo, 1.0) for tipo in tipos),
+        dtype=np.float32,
+        count=len(tipos),
+    )
+
+
+def _perfil_ponderado(filas: list[tuple[Any, Any, int]]) -> list[float] | None:
+    """
+    Promedio ponderado de embeddings a partir de agregados por tipo.
+
+    Cada fila es ``(tipo, suma_embeddings, cantidad)``, tal como la devuelve
+    ``SUM(embedding)``/``COUNT(embedding)`` agrupado por tipo de interacción:
+    el perfil es ``Σ peso·suma / Σ peso·cantidad``. Las filas sin embeddings
+    se ignoran. Retorna ``None`` si no queda ninguna o la suma de pesos es cero.
+    """
+    filas = [fila for fila in filas if fila[1] is not None and fila[2]]
+    if not filas:
+        return None
+
+    pesos = _pesos_por_tipo([tipo for tipo, _, _ in filas])
+    sumas = np.asarray([suma for _, suma, _ in filas], dtype=np.float32)
+    cantidades = np.asarray([cantidad for _, _, cantidad in filas], dtype=np.float32)
+
+    suma_pesos = float(pesos @ cantidades)
+    if suma_pesos == 0.0:
+        return None
+
+    return (pesos @ sumas / suma_pesos).tolist()
+
+
+@lru_cache(maxsize=1024)
+def _texto_razon(partes: tuple[str, ...]) -> str:
+    """
+    Texto de razón de Fase 1 a partir de sus partes. Las combinaciones
+    (categoría, barrio, precio, tags) se repiten entre eventos y pedidos:
+    cada una se arma una vez y los resultados comparten el mismo ``str``.
+    """
+    if partes:
+        return "Porque te gustan: " + " · ".join(partes)
+    return "Próximamente en Buenos Aires"
+
+
+def _indices_top_k(puntajes: np.ndarray, k: int) -> np.ndarray:
+    """
+    Índices de los ``k`` puntajes más altos, sin orden entre ellos.
+    ``argpartition`` es O(N): no ordena el resto como haría ``sorted()[:k]``.
+    """
+    if k >= len(puntajes):
+        return np.arange(len(puntajes))
+    if k <= 0:
+        return np.arange(0)
+    return np.argpartition(-puntajes, k - 1)[:k]
+
+
+def _posiciones_en_grupo(claves: list[str]) -> np.ndarray:
+    """
+    Para cada elemento, cuántos elementos anteriores comparten su clave.
+
+    Etiqueta las claves con ``np.unique``, las agrupa con un ``argsort``
+    estable (que conserva el orden original dentro de cada grupo) y resta
+    a cada posición el inicio de su bloque.
+    """
+    if not claves:
+        return np.empty(0, dtype=np.intp)
+
+    _, grupos = np.unique(np.asarray(claves, dtype=object), return_inverse=True)
+    orden = np.argsort(grupos, kind="stable")
+    agrupados = grupos[orden]
+
+    indices = np.arange(len(claves))
+    inicio_bloque = np.r_[True, agrupados[1:] != agrupados[:-1]]
+    primero = np.maximum.accumulate(np.where(inicio_bloque, indices, 0))
+
+    posiciones = np.empty_like(indices)
+    posiciones[orden] = indices - primero
+    return posiciones
+
 
 class RecommenderService:
     """
@@ -42,8 +330,16 @@ class RecommenderService:
     Híbrido: combina Fase 1 y Fase 2 con pesos iguales.
     """
 
-    def __init__(self, db: AsyncSession) -> None:
+    def __init__(
+        self,
+        db: AsyncSession,
+        session_factory: async_sessionmaker[AsyncSession] | None = None,
+    ) -> None:
         self.db = db
+        # Una AsyncSession no admite consultas concurrentes: si se provee una
+        # fábrica, el híbrido abre una sesión propia para la Fase 2 y ejecuta
+        # ambas fases en paralelo.
+        self.session_factory = session_factory
 
     # ─────────────────────────────────────────────────────────────────────────
     # Métodos públicos
@@ -64,11 +360,13 @@ class RecommenderService:
         6. Ordenar por relevancia (puntaje)
         7. Diversificar (máximo 3 eventos por categoría)
         """
-        user = await self._get_user(user_id)
-        if not user:
+        if limite <= 0:
+            return []
+
+        prefs = await self._get_preferencias(user_id)
+        if prefs is None:
             return []
 
-        prefs = user.preferencias or {}
         categorias_fav = [c.lower() for c in prefs.get("categorias_favoritas", [])]
         barrios_fav = [b.lower() for b in prefs.get("barrios_preferidos", [])]
         rango = prefs.get("rango_precio") or prefs.get("rango_precios") or {}
@@ -87,7 +385,7 @@ class RecommenderService:
         # Los filtros de barrio y tags se aplican en Python al puntuar.
         query = (
             select(Event)
-            .options(selectinload(Event.venue), selectinload(Event.categoria))
+            .options(*_OPCIONES_CANDIDATO)
             .join(Category, Event.categoria_id == Category.id, isouter=True)
             .where(Event.fecha_inicio >= ahora)
         )
@@ -114,9 +412,12 @@ class RecommenderService:
             return await self.recomendar_populares(limite)
 
         # ── Puntuar y generar razones ────────────────────────────────────────
-        scored: list[tuple[float, Event, str]] = []
-        for event in candidatos:
-            puntaje, razon = self._puntuar_evento(
+        # Una fila de rasgos por candidato; los puntajes salen de un único
+        # producto matriz-vector contra _PESOS_RELEVANCIA.
+        rasgos = np.empty((len(candidatos), len(_PESOS_RELEVANCIA)), dtype=np.float32)
+        razones: list[str] = []
+        for i, event in enumerate(candidatos):
+            rasgos[i], razon = self._rasgos_evento(
                 event,
                 categorias_fav,
                 barrios_fav,
@@ -124,12 +425,17 @@ class RecommenderService:
                 precio_max,
                 tags_interes,
             )
-            scored.append((puntaje, event, razon))
+            razones.append(razon)
 
-        scored.sort(key=lambda x: x[0], reverse=True)
+        puntajes = rasgos @ _PESOS_RELEVANCIA
+        # argsort estable sobre el negado: orden descendente que respeta el
+        # orden original (por fecha) entre empates.
+        orden = np.argsort(-puntajes, kind="stable")
+        scored = [(float(puntajes[i]), candidatos[i], razones[i]) for i in orden]
 
         return self._diversificar(scored, max_por_categoria=3, limite=limite)
 
+    @_con_respaldo
     async def recomendar_similares(
         self, event_id: str, limite: int = 5
     ) -> list[dict[str, Any]]:
@@ -137,16 +443,17 @@ class RecommenderService:
         Eventos similares a uno dado.
         Usa: misma categoría + embeddings vectoriales (si disponibles) + fechas cercanas.
         """
+        if limite <= 0:
+            return []
+
         evento_ref = await self._get_evento(event_id)
         if not evento_ref:
             return []
 
         ahora = datetime.now(timezone.utc)
 
-        query = (
-            select(Event)
-            .options(selectinload(Event.venue), selectinload(Event.categoria))
-            .where(Event.id != evento_ref.id, Event.fecha_inicio >= ahora)
+        query = _select_filas_evento().where(
+            Event.id != evento_ref.id, Event.fecha_inicio >= ahora
         )
 
         if evento_ref.categoria_id:
@@ -155,28 +462,24 @@ class RecommenderService:
         # Ordenar por similitud vectorial si hay embedding; si no, por fecha
         if evento_ref.embedding is not None:
             query = query.order_by(
-                Event.embedding.cosine_distance(evento_ref.embedding)
+                EMBEDDING_HALFVEC.cosine_distance(evento_ref.embedding)
             )
         else:
             query = query.order_by(Event.fecha_inicio.asc())
 
         query = query.limit(limite)
         result = await self.db.execute(query)
-        candidatos = list(result.scalars().all())
+        candidatos = result.mappings().all()
 
         cat_nombre = (
             evento_ref.categoria.nombre if evento_ref.categoria else "mismo género"
         )
-        titulo_ref = evento_ref.titulo[:40]
+        # La razón es la misma para todos los candidatos: se arma una vez.
+        razon = f"Similar a '{evento_ref.titulo[:40]}' · categoría: {cat_nombre}"
 
         return [
-            {
-                "event": self._serializar_evento(e),
-                "razon": (
-                    f"Similar a '{titulo_ref}' · categoría: {cat_nombre}"
-                ),
-            }
-            for e in candidatos
+            {"event": self._serializar_fila(fila), "razon": razon}
+            for fila in candidatos
         ]
 
     async def recomendar_populares(
@@ -189,17 +492,23 @@ class RecommenderService:
           guardado/asistió: ×3 · compartido: ×2 · vista: ×1 · clic: ×0.5
         Se complementa con los próximos eventos si hay pocos con interacciones.
         """
+        if limite <= 0:
+            return []
+
         ahora = datetime.now(timezone.utc)
 
-        # Contar interacciones agrupadas por evento y tipo
-        rows_result = await self.db.execute(
+        # Contar interacciones agrupadas por evento y tipo. Es la única
+        # lectura que crece con todo el catálogo: se consume por lotes desde
+        # un cursor del servidor y se acumula sin materializar todas las filas.
+        filas = await self.db.stream(
             select(
                 Interaction.event_id,
                 Interaction.tipo,
                 func.count(Interaction.id).label("n"),
-            ).group_by(Interaction.event_id, Interaction.tipo)
+            )
+            .group_by(Interaction.event_id, Interaction.tipo)
+            .execution_options(yield_per=_LOTE_POPULARIDAD)
         )
-        rows = rows_result.all()
 
         pesos = {
             InteractionType.GUARDADO: 3.0,
@@ -210,19 +519,24 @@ class RecommenderService:
         }
 
         puntajes: dict[uuid.UUID, float] = {}
-        for row in rows:
-            eid = row.event_id
-            puntajes[eid] = puntajes.get(eid, 0.0) + pesos.get(row.tipo, 0.5) * row.n
+        async for lote in filas.partitions():
+            for row in lote:
+                eid = row.event_id
+                puntajes[eid] = puntajes.get(eid, 0.0) + pesos.get(row.tipo, 0.5) * row.n
 
         eventos: list[Event] = []
 
         if puntajes:
-            top_ids = sorted(puntajes, key=lambda eid: puntajes[eid], reverse=True)
+            # Solo importa el conjunto de los ``limite * 3`` más populares: la
+            # consulta los reordena por fecha, así que basta una partición.
+            ids = list(puntajes)
+            valores = np.fromiter(puntajes.values(), dtype=np.float64, count=len(ids))
+            top_ids = [ids[i] for i in _indices_top_k(valores, limite * 3)]
             result = await self.db.execute(
                 select(Event)
-                .options(selectinload(Event.venue), selectinload(Event.categoria))
+                .options(*_OPCIONES_CANDIDATO)
                 .where(
-                    Event.id.in_(top_ids[: limite * 3]),
+                    Event.id.in_(top_ids),
                     Event.fecha_inicio >= ahora,
                 )
                 .order_by(Event.fecha_inicio.asc())
@@ -235,7 +549,7 @@ class RecommenderService:
             ya_incluidos = {e.id for e in eventos}
             extra_result = await self.db.execute(
                 select(Event)
-                .options(selectinload(Event.venue), selectinload(Event.categoria))
+                .options(*_OPCIONES_CANDIDATO)
                 .where(
                     Event.fecha_inicio >= ahora,
                     Event.id.notin_(ya_incluidos) if ya_incluidos else True,
@@ -266,22 +580,19 @@ class RecommenderService:
         """
         ahora = datetime.now(timezone.utc)
         query_text = (contexto.get("query") or "").lower()
+        claves = {m.lastgroup for m in _PATRON_CONTEXTO.finditer(query_text)}
+        rangos = _rangos_del_dia(ahora.date())
         razones: list[str] = []
 
         filtros: list[Any] = [Event.fecha_inicio >= ahora]
 
         # ── Gratuito ─────────────────────────────────────────────────────────
-        if contexto.get("gratis") or any(
-            k in query_text for k in ("gratis", "gratuito", "gratis", "free")
-        ):
+        if contexto.get("gratis") or "gratis" in claves:
             filtros.append(Event.es_gratuito.is_(True))
             razones.append("evento gratuito")
 
         # ── Con niños / familiar ──────────────────────────────────────────────
-        if any(
-            k in query_text
-            for k in ("niños", "ninos", "familiar", "familia", "kids", "infantil")
-        ):
+        if "ninos" in claves:
             filtros.append(
                 or_(
                     Event.tags.contains(["familiar"]),
@@ -293,12 +604,12 @@ class RecommenderService:
             razones.append("apto para niños y familia")
 
         # ── Esta noche ────────────────────────────────────────────────────────
-        if "esta noche" in query_text or (
-            "noche" in query_text and "esta noche" not in query_text
-        ):
-            hoy = ahora.date()
-            inicio_noche = datetime.combine(hoy, time(19, 0), tzinfo=timezone.utc)
-            fin_noche = datetime.combine(hoy, time(23, 59), tzinfo=timezone.utc)
+        # Si la franja ya terminó, ``fecha_inicio >= ahora`` la deja vacía:
+        # se responde sin consultar la base.
+        if "noche" in claves:
+            inicio_noche, fin_noche = rangos["noche"]
+            if fin_noche < ahora:
+                return []
             filtros += [
                 Event.fecha_inicio >= inicio_noche,
                 Event.fecha_inicio <= fin_noche,
@@ -306,9 +617,10 @@ class RecommenderService:
             razones.append("esta noche")
 
         # ── Hoy ───────────────────────────────────────────────────────────────
-        elif "hoy" in query_text:
-            hoy_inicio = ahora.replace(hour=0, minute=0, second=0, microsecond=0)
-            hoy_fin = ahora.replace(hour=23, minute=59, second=59, microsecond=0)
+        elif "hoy" in claves:
+            hoy_inicio, hoy_fin = rangos["hoy"]
+            if hoy_fin < ahora:
+                return []
             filtros += [
                 Event.fecha_inicio >= hoy_inicio,
                 Event.fecha_inicio <= hoy_fin,
@@ -316,12 +628,8 @@ class RecommenderService:
             razones.append("hoy")
 
         # ── Fin de semana ─────────────────────────────────────────────────────
-        elif any(k in query_text for k in ("fin de semana", "finde", "weekend")):
-            dias_hasta_sabado = (5 - ahora.weekday()) % 7 or 7
-            sabado = (ahora + timedelta(days=dias_hasta_sabado)).replace(
-                hour=0, minute=0, second=0, microsecond=0
-            )
-            fin_domingo = sabado + timedelta(days=1, hours=23, minutes=59, seconds=59)
+        elif "finde" in claves:
+            sabado, fin_domingo = rangos["finde"]
             filtros += [
                 Event.fecha_inicio >= sabado,
                 Event.fecha_inicio <= fin_domingo,
@@ -330,22 +638,18 @@ class RecommenderService:
 
         # ── Barrio específico ─────────────────────────────────────────────────
         barrio = contexto.get("barrio")
-        stmt = (
-            select(Event)
-            .options(selectinload(Event.venue), selectinload(Event.categoria))
-        )
-
         if barrio:
-            stmt = stmt.join(Venue, Event.venue_id == Venue.id).where(
-                *filtros, func.lower(Venue.barrio) == barrio.lower()
-            )
+            filtros.append(func.lower(Venue.barrio) == barrio.lower())
             razones.append(f"en {barrio}")
-        else:
-            stmt = stmt.where(*filtros)
 
-        stmt = stmt.order_by(Event.fecha_inicio.asc()).limit(20)
+        stmt = (
+            _select_filas_evento()
+            .where(*filtros)
+            .order_by(Event.fecha_inicio.asc())
+            .limit(20)
+        )
         result = await self.db.execute(stmt)
-        eventos = list(result.scalars().all())
+        filas = result.mappings().all()
 
         razon_str = (
             "Seleccionado porque: " + " · ".join(razones)
@@ -354,10 +658,11 @@ class RecommenderService:
         )
 
         return [
-            {"event": self._serializar_evento(e), "razon": razon_str}
-            for e in eventos
+            {"event": self._serializar_fila(fila), "razon": razon_str}
+            for fila in filas
         ]
 
+    @_con_respaldo
     async def recomendar_basado_en_contenido(
         self, user_id: str, limite: int = 10
     ) -> list[dict[str, Any]]:
@@ -376,30 +681,35 @@ class RecommenderService:
         5. Filtrar los que ya vio
         6. Aplicar diversificación
         """
-        # Paso 1: IDs de todos los eventos con los que el usuario interactuó.
-        result = await self.db.execute(
-            select(Interaction.event_id)
-            .where(Interaction.user_id == uuid.UUID(user_id))
-            .distinct()
-        )
-        ids_interactuados = [str(row.event_id) for row in result.all()]
+        if limite <= 0:
+            return []
 
-        if not ids_interactuados:
-            return await self.recomendar_populares(limite)
+        # Pasos 1 a 3: IDs interactuados y perfil de gustos, servidos desde
+        # ``_cache_perfiles`` mientras el usuario no registre interacciones.
+        clave = str(uuid.UUID(user_id))
+        historial = _cache_perfiles.get(clave)
+        if historial is None:
+            historial = await self._historial_contenido(user_id)
+            _cache_perfiles.put(clave, historial)
+        ids_interactuados, perfil = historial
 
-        # Paso 2 y 3: Calcular perfil de gustos del usuario.
-        perfil = await self.calcular_perfil_usuario(user_id)
         if perfil is None:
-            # Sin embeddings → fallback a populares
+            # Sin interacciones o sin embeddings → fallback a populares
             return await self.recomendar_populares(limite)
 
         # Paso 4 y 5: Buscar eventos cercanos al perfil excluyendo ya vistos.
-        candidatos = await self.buscar_por_perfil(perfil, ids_interactuados)
+        # El top-K lo resuelve PostgreSQL; se piden 3× el límite como margen
+        # para que la diversificación por categoría tenga de dónde elegir, y
+        # el tope por categoría ya se aplica en la misma consulta.
+        candidatos = await self.buscar_por_perfil(
+            perfil, ids_interactuados, limite=limite * 3, max_por_categoria=3
+        )
 
         if not candidatos:
             return await self.recomendar_populares(limite)
 
-        # Paso 6: Diversificar (máximo 3 eventos por categoría).
+        # Paso 6: Diversificar (máximo 3 eventos por categoría). Con el tope
+        # aplicado en SQL, aquí solo recorta a ``limite`` conservando el orden.
         scored = [
             (0.0, evento, "Basado en tus intereses recientes")
             for evento in candidatos
@@ -416,24 +726,41 @@ class RecommenderService:
         - 50 % de comportamiento implícito (recomendar_basado_en_contenido)
         - Deduplica y diversifica el resultado final
         """
+        if limite <= 0:
+            return []
+
         mitad = max(1, limite // 2)
         resto = limite - mitad
 
-        # Ejecutar ambas fases
-        explicitas = await self.recomendar_para_usuario(user_id, mitad)
-        contenido = await self.recomendar_basado_en_contenido(user_id, resto)
-
-        # Deduplicar: priorizar las explícitas
-        ids_incluidos = {item["event"]["id"] for item in explicitas}
-        contenido_nuevo = [
-            item for item in contenido if item["event"]["id"] not in ids_incluidos
-        ]
-
-        combinados = explicitas + contenido_nuevo
+        # Ejecutar ambas fases: en paralelo si hay una sesión extra disponible
+        if self.session_factory is None or _SESIONES_EXTRA.locked():
+            explicitas = await self.recomendar_para_usuario(user_id, mitad)
+            contenido = await self.recomendar_basado_en_contenido(user_id, resto)
+        else:
+            # TaskGroup cancela la otra fase si una falla, antes de cerrar la
+            # sesión extra que podría seguir usando.
+            async with _SESIONES_EXTRA, self.session_factory() as db_contenido:
+                async with asyncio.TaskGroup() as grupo:
+                    tarea_explicitas = grupo.create_task(
+                        self.recomendar_para_usuario(user_id, mitad)
+                    )
+                    tarea_contenido = grupo.create_task(
+                        RecommenderService(db_contenido).recomendar_basado_en_contenido(
+                            user_id, resto
+                        )
+                    )
+            explicitas = tarea_explicitas.result()
+            contenido = tarea_contenido.result()
+
+        # Deduplicar por id en un único dict: el orden de inserción prioriza
+        # las explícitas y también descarta repetidos dentro de cada fase.
+        combinados: dict[str, dict[str, Any]] = {}
+        for item in explicitas + contenido:
+            combinados.setdefault(item["event"]["id"], item)
 
         # Diversificación final sobre los resultados ya serializados
         return self._diversificar_resultados(
-            combinados, max_por_categoria=3, limite=limite
+            list(combinados.values()), max_por_categoria=3, limite=limite
         )
 
     # ─────────────────────────────────────────────────────────────────────────
@@ -449,60 +776,76 @@ class RecommenderService:
         Retorna ``None`` si el usuario no tiene interacciones o ninguno de los
         eventos interactuados tiene embedding almacenado.
         """
-        result = await self.db.execute(
-            select(Interaction.tipo, Event.embedding)
-            .join(Event, Interaction.event_id == Event.id)
-            .where(
-                Interaction.user_id == uuid.UUID(user_id),
-                Event.embedding.isnot(None),
-            )
-        )
-        filas = result.all()
-
-        if not filas:
-            return None
-
-        suma_pesos = 0.0
-        acumulado: np.ndarray | None = None
-
-        for tipo, embedding in filas:
-            peso = _PESOS_CONTENIDO.get(tipo, 1.0)
-            vec = np.array(embedding, dtype=float)
-            acumulado = vec * peso if acumulado is None else acumulado + vec * peso
-            suma_pesos += peso
-
-        if suma_pesos == 0.0 or acumulado is None:
-            return None
-
-        return (acumulado / suma_pesos).tolist()
+        # Misma consulta agrupada que usa la Fase 2: una sola a mantener.
+        return (await self._historial_contenido(user_id))[1]
 
     async def buscar_por_perfil(
-        self, perfil: list[float], excluir: list[str]
+        self,
+        perfil: list[float],
+        excluir: list[str],
+        limite: int = 50,
+        max_por_categoria: int | None = None,
     ) -> list[Event]:
         """
         Busca eventos cercanos al perfil excluyendo ya vistos.
 
-        Ordena los eventos futuros con embedding por distancia coseno al
-        vector ``perfil`` y excluye los IDs presentes en ``excluir``.
-        Recupera hasta 50 candidatos para que la capa de diversificación
-        tenga suficiente material.
+        Todo el filtrado y el ranking se resuelven en PostgreSQL: se filtran
+        los eventos futuros con embedding que no estén en ``excluir``, se
+        ordenan por distancia coseno (``<=>``) al vector ``perfil`` y solo se
+        transfieren los ``limite`` más cercanos. Por defecto se recuperan 50
+        candidatos para que la capa de diversificación tenga material.
+
+        Con ``max_por_categoria``, la diversificación también ocurre en la DB:
+        sobre esos ``limite`` vecinos, ``ROW_NUMBER() OVER (PARTITION BY
+        categoria_id)`` descarta los que exceden el máximo por categoría y no
+        se hidratan filas que ``_diversificar`` tiraría después.
         """
         ahora = datetime.now(timezone.utc)
-        excluir_uuids = [uuid.UUID(eid) for eid in excluir]
 
-        query = (
-            select(Event)
-            .options(selectinload(Event.venue), selectinload(Event.categoria))
-            .where(
-                Event.fecha_inicio >= ahora,
-                Event.embedding.isnot(None),
-            )
-            .order_by(Event.embedding.cosine_distance(perfil))
-            .limit(50)
-        )
+        filtros: list[Any] = [
+            Event.fecha_inicio >= ahora,
+            Event.embedding.isnot(None),
+        ]
+        if excluir:
+            filtros.append(Event.id.notin_([uuid.UUID(eid) for eid in excluir]))
+
+        distancia = EMBEDDING_HALFVEC.cosine_distance(perfil)
 
-        if excluir_uuids:
-            query = query.where(Event.id.notin_(excluir_uuids))
+        if max_por_categoria is None:
+            query = (
+                select(Event)
+                .options(*_OPCIONES_CANDIDATO)
+                .where(*filtros)
+                .order_by(distancia)
+                .limit(limite)
+            )
+        else:
+            # El top-K interno conserva el ORDER BY … LIMIT que resuelve el
+            # índice HNSW; la ventana solo recorre esos ``limite`` vecinos.
+            vecinos = (
+                select(Event.id, Event.categoria_id, distancia.label("distancia"))
+                .where(*filtros)
+                .order_by(distancia)
+                .limit(limite)
+                .subquery()
+            )
+            ranking = select(
+                vecinos.c.id,
+                vecinos.c.distancia,
+                func.row_number()
+                .over(
+                    partition_by=vecinos.c.categoria_id,
+                    order_by=vecinos.c.distancia,
+                )
+                .label("posicion"),
+            ).subquery()
+            query = (
+                select(Event)
+                .options(*_OPCIONES_CANDIDATO)
+                .join(ranking, Event.id == ranking.c.id)
+                .where(ranking.c.posicion <= max_por_categoria)
+                .order_by(ranking.c.distancia)
+            )
 
         result = await self.db.execute(query)
         return list(result.scalars().all())
@@ -517,6 +860,58 @@ class RecommenderService:
         )
         return result.scalar_one_or_none()
 
+    async def _get_preferencias(self, user_id: str) -> dict[str, Any] | None:
+        """
+        Preferencias del usuario, o None si no existe.
+        Se sirven desde ``_cache_preferencias`` mientras no venza el TTL; los
+        usuarios inexistentes no se cachean (pueden registrarse enseguida).
+        """
+        clave = str(uuid.UUID(user_id))
+        prefs = _cache_preferencias.get(clave)
+        if prefs is not None:
+            return prefs
+
+        user = await self._get_user(user_id)
+        if user is None:
+            return None
+
+        prefs = user.preferencias or {}
+        _cache_preferencias.put(clave, prefs)
+        return prefs
+
+    async def _historial_contenido(
+        self, user_id: str
+    ) -> tuple[list[str], list[float] | None]:
+        """
+        IDs de eventos interactuados y perfil ponderado de sus embeddings.
+
+        Una sola consulta agrupada por tipo de interacción trae los IDs y la
+        suma/cantidad de embeddings. La reducción ocurre en PostgreSQL: viajan
+        a lo sumo cinco vectores, no uno por interacción.
+        """
+        result = await self.db.execute(
+            select(
+                Interaction.tipo,
+                func.array_agg(Interaction.event_id.distinct()),
+                func.sum(Event.embedding),
+                func.count(Event.embedding),
+            )
+            .join(Event, Interaction.event_id == Event.id)
+            .where(Interaction.user_id == uuid.UUID(user_id))
+            .group_by(Interaction.tipo)
+        )
+        por_tipo = result.all()
+
+        ids_interactuados = list(
+            dict.fromkeys(
+                str(event_id) for _, event_ids, _, _ in por_tipo for event_id in event_ids
+            )
+        )
+        perfil = _perfil_ponderado(
+            [(tipo, suma, cantidad) for tipo, _, suma, cantidad in por_tipo]
+        )
+        return ids_interactuados, perfil
+
     async def _get_evento(self, event_id: str) -> Event | None:
         result = await self.db.execute(
             select(Event)
@@ -530,14 +925,14 @@ class RecommenderService:
     ) -> list[Event]:
         result = await self.db.execute(
             select(Event)
-            .options(selectinload(Event.venue), selectinload(Event.categoria))
+            .options(*_OPCIONES_CANDIDATO)
             .where(Event.fecha_inicio >= desde)
             .order_by(Event.fecha_inicio.asc())
             .limit(limite)
         )
         return list(result.scalars().all())
 
-    def _puntuar_evento(
+    def _rasgos_evento(
         self,
         event: Event,
         categorias_fav: list[str],
@@ -545,27 +940,22 @@ class RecommenderService:
         precio_min_pref: float | None,
         precio_max: float | None,
         tags_interes: list[str],
-    ) -> tuple[float, str]:
+    ) -> tuple[list[float], str]:
         """
-        Calcula el puntaje de relevancia y genera el texto de razón.
-
-        Pesos:
-          categoría favorita   → +5
-          barrio preferido     → +3
-          precio dentro rango  → +2
-          evento gratuito      → +2 (si hay filtro de precio)
-          tag de interés       → +1.5 por coincidencia
-          proximidad ≤3 días   → +2
-          proximidad ≤7 días   → +1
+        Extrae los rasgos de relevancia del evento y genera el texto de razón.
+
+        Devuelve una fila alineada con ``_PESOS_RELEVANCIA``:
+          [categoría favorita, barrio preferido, precio/gratuito,
+           tags coincidentes, proximidad ≤3 días, proximidad ≤7 días]
         """
-        puntaje = 0.0
+        categoria = barrio = precio = proximo = semana = 0.0
         razones: list[str] = []
 
         cat_nombre = (
             event.categoria.nombre.lower() if event.categoria else ""
         )
         if cat_nombre and cat_nombre in categorias_fav:
-            puntaje += 5.0
+            categoria = 1.0
             razones.append(f"eventos de {event.categoria.nombre}")  # type: ignore[union-attr]
 
         barrio_evento = (
@@ -574,36 +964,33 @@ class RecommenderService:
             else ""
         )
         if barrio_evento and barrio_evento in barrios_fav:
-            puntaje += 3.0
+            barrio = 1.0
             razones.append(f"en {event.venue.barrio}")  # type: ignore[union-attr]
 
         if precio_max is not None:
             if event.es_gratuito:
-                puntaje += 2.0
+                precio = 1.0
                 razones.append("gratuito")
             elif event.precio_min is not None and float(event.precio_min) <= precio_max:
-                puntaje += 2.0
+                precio = 1.0
                 razones.append("dentro de tu rango de precio")
 
         event_tags = [t.lower() for t in (event.tags or [])]
         matches = set(tags_interes) & set(event_tags)
         if matches:
-            puntaje += len(matches) * 1.5
             razones.append(f"etiquetado: {', '.join(sorted(matches))}")
 
         if event.fecha_inicio:
             dias = (event.fecha_inicio - datetime.now(timezone.utc)).days
             if dias <= 3:
-                puntaje += 2.0
+                proximo = 1.0
             elif dias <= 7:
-                puntaje += 1.0
-
-        if razones:
-            razon = "Porque te gustan: " + " · ".join(razones)
-        else:
-            razon = "Próximamente en Buenos Aires"
+                semana = 1.0
 
-        return puntaje, razon
+        return (
+            [categoria, barrio, precio, float(len(matches)), proximo, semana],
+            _texto_razon(tuple(razones)),
+        )
 
     def _diversificar(
         self,
@@ -615,20 +1002,18 @@ class RecommenderService:
         Selecciona los mejores eventos garantizando diversidad de categorías.
         Permite hasta `max_por_categoria` eventos de la misma categoría.
         """
-        contador: Counter[str] = Counter()
-        resultado: list[dict[str, Any]] = []
-
-        for _puntaje, event, razon in scored:
-            if len(resultado) >= limite:
-                break
-            cat_key = str(event.categoria_id) if event.categoria_id else "sin_categoria"
-            if contador[cat_key] < max_por_categoria:
-                contador[cat_key] += 1
-                resultado.append(
-                    {"event": self._serializar_evento(event), "razon": razon}
-                )
+        claves = [
+            str(event.categoria_id) if event.categoria_id else "sin_categoria"
+            for _puntaje, event, _razon in scored
+        ]
+        seleccion = np.flatnonzero(
+            _posiciones_en_grupo(claves) < max_por_categoria
+        )[:limite]
 
-        return resultado
+        return [
+            {"event": self._serializar_evento(scored[i][1]), "razon": scored[i][2]}
+            for i in seleccion
+        ]
 
     def _diversificar_resultados(
         self,
@@ -642,18 +1027,12 @@ class RecommenderService:
 
         Complementa a ``_diversificar``, que opera sobre tuplas ``(score, Event, razon)``.
         """
-        contador: Counter[str] = Counter()
-        resultado: list[dict[str, Any]] = []
-
-        for item in resultados:
-            if len(resultado) >= limite:
-                break
-            cat = item["event"].get("categoria") or "sin_categoria"
-            if contador[cat] < max_por_categoria:
-                contador[cat] += 1
-                resultado.append(item)
+        claves = [item["event"].get("categoria") or "sin_categoria" for item in resultados]
+        seleccion = np.flatnonzero(
+            _posiciones_en_grupo(claves) < max_por_categoria
+        )[:limite]
 
-        return resultado
+        return [resultados[i] for i in seleccion]
 
     def _serializar_evento(self, event: Event) -> dict[str, Any]:
         """Convierte un objeto Event ORM a un dict JSON-serializable."""
@@ -688,3 +1067,40 @@ class RecommenderService:
             "url_fuente": event.url_fuente,
             "tags": event.tags,
         }
+
+    def _serializar_fila(self, fila: RowMapping) -> dict[str, Any]:
+        """
+        Igual que ``_serializar_evento`` pero a partir de una fila de
+        ``_select_filas_evento`` (sin entidades ORM de por medio).
+        """
+        return {
+            "id": str(fila["id"]),
+            "titulo": fila["titulo"],
+            "descripcion": fila["descripcion"],
+            "categoria": fila["categoria"],
+            "subcategorias": fila["subcategorias"],
+            "fecha_inicio": (
+                fila["fecha_inicio"].isoformat() if fila["fecha_inicio"] else None
+            ),
+            "fecha_fin": fila["fecha_fin"].isoformat() if fila["fecha_fin"] else None,
+            "venue": (
+                {
+                    "id": str(fila["venue_id"]),
+                    "nombre": fila["venue_nombre"],
+                    "barrio": fila["venue_barrio"],
+                    "direccion": fila["venue_direccion"],
+                }
+                if fila["venue_id"] is not None
+                else None
+            ),
+            "precio_min": (
+                float(fila["precio_min"]) if fila["precio_min"] is not None else None
+            ),
+            "precio_max": (
+                float(fila["precio_max"]) if fila["precio_max"] is not None else None
+            ),
+            "es_gratuito": fila["es_gratuito"],
+            "imagen_url": fila["imagen_url"],
+            "url_fuente": fila["url_fuente"],
+            "tags": fila["tags"],
+        }
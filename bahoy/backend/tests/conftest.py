@@ -4,6 +4,7 @@ Bahoy Backend - Fixtures compartidos para pytest.
 Este módulo provee fixtures reutilizables para todos los tests:
   - Modelos ORM con datos realistas de Buenos Aires
   - Mock de AsyncSession para evitar dependencia de base de datos
+  - Stub del modelo de sentence-transformers, instalado una vez por sesión
   - Helpers para crear embeddings deterministas
 
 Ejecutar la suite completa:
@@ -16,10 +17,11 @@ O desde el host (con entorno activado):
 
 from __future__ import annotations
 
+import math
 import uuid
 from datetime import datetime, timedelta, timezone
 from decimal import Decimal
-from typing import Any
+from typing import Any, Iterator
 from unittest.mock import AsyncMock, MagicMock
 
 import numpy as np
@@ -30,6 +32,7 @@ from app.models.event import EMBEDDING_DIMENSION, Event
 from app.models.interaction import Interaction, InteractionType
 from app.models.user import User
 from app.models.venue import Venue, VenueType
+from app.nlp import classifier
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -47,9 +50,8 @@ def make_embedding(seed: int = 0, dim: int = EMBEDDING_DIMENSION) -> list[float]
     Genera un embedding normalizado de dimensión `dim`.
     Determinista gracias al seed.
     """
-    rng = np.random.default_rng(seed)
-    v = rng.random(dim).astype(float)
-    return (v / np.linalg.norm(v)).tolist()
+    v = np.random.default_rng(seed).random(dim)
+    return (v * (1.0 / math.sqrt(float(v @ v)))).tolist()
 
 
 def make_db_result(rows: list[Any]) -> MagicMock:
@@ -70,12 +72,28 @@ def make_db_result(rows: list[Any]) -> MagicMock:
     return result
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# Fixtures de tiempo
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+@pytest.fixture(scope="session")
+def ahora() -> datetime:
+    """Instante actual (UTC), tomado una sola vez por sesión."""
+    return datetime.now(timezone.utc)
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Fixtures de modelos ORM
 # ─────────────────────────────────────────────────────────────────────────────
+#
+# Los fixtures de modelos tienen scope="session": se construyen una única vez
+# y se comparten entre todos los tests. Son de SOLO LECTURA; un test que
+# necesite asignar atributos debe instanciar su propio modelo (p. ej.
+# `Event()`) en lugar de mutar el fixture compartido.
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_category() -> Category:
     """Categoría 'Teatro' sin padre (categoría raíz)."""
     cat = Category()
@@ -88,7 +106,7 @@ def sample_category() -> Category:
     return cat
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_category_musica() -> Category:
     """Categoría 'Música' para tests multi-categoría."""
     cat = Category()
@@ -101,7 +119,7 @@ def sample_category_musica() -> Category:
     return cat
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_venue() -> Venue:
     """Venue 'Teatro San Martín' en San Nicolás."""
     venue = Venue()
@@ -117,7 +135,7 @@ def sample_venue() -> Venue:
     return venue
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_venue_palermo() -> Venue:
     """Venue en Palermo para tests de filtros por barrio."""
     venue = Venue()
@@ -133,7 +151,7 @@ def sample_venue_palermo() -> Venue:
     return venue
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_event(sample_category, sample_venue) -> Event:
     """Evento 'Hamlet' con todos los campos completos."""
     event = Event()
@@ -163,7 +181,7 @@ def sample_event(sample_category, sample_venue) -> Event:
     return event
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_event_gratuito(sample_category_musica, sample_venue_palermo) -> Event:
     """Evento gratuito de música al aire libre."""
     event = Event()
@@ -190,7 +208,7 @@ def sample_event_gratuito(sample_category_musica, sample_venue_palermo) -> Event
     return event
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_user() -> User:
     """Usuario con preferencias explícitas de teatro y música."""
     user = User()
@@ -208,7 +226,7 @@ def sample_user() -> User:
     return user
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_user_nuevo() -> User:
     """Usuario recién registrado, sin preferencias ni historial."""
     user = User()
@@ -221,7 +239,7 @@ def sample_user_nuevo() -> User:
     return user
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_interaction(sample_user, sample_event) -> Interaction:
     """Interacción GUARDADO entre usuario y evento."""
     inter = Interaction()
@@ -245,3 +263,63 @@ def sample_interaction(sample_user, sample_event) -> Interaction:
 def mock_db() -> AsyncMock:
     """AsyncMock de AsyncSession. Configura .execute() en cada test."""
     return AsyncMock()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Fixture del modelo de embeddings (sentence-transformers)
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+# Vector que devuelve el stub por defecto: se calcula una sola vez al importar
+# y es de solo lectura porque se comparte entre todos los tests.
+_DEFAULT_VEC = np.asarray(make_embedding(seed=0), dtype=np.float32)
+_DEFAULT_VEC.setflags(write=False)
+
+
+def _encode_por_defecto(texto: str) -> np.ndarray:
+    """Por defecto el modelo fake devuelve el mismo vector para cualquier texto."""
+    return _DEFAULT_VEC
+
+
+class _FakeST:
+    """
+    Sustituto liviano de SentenceTransformer: solo expone `encode`.
+    Es una clase con __slots__ (no MagicMock) para evitar el costo de los
+    mocks en cada llamada; los tests reemplazan `_encode` según necesiten
+    y leen `call_count` para verificar las llamadas.
+    """
+
+    __slots__ = ("_encode", "call_count")
+
+    def __init__(self, fn) -> None:
+        self._encode = fn
+        self.call_count = 0
+
+    def encode(self, texto):
+        self.call_count += 1
+        return self._encode(texto)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _install_fake_model() -> Iterator[_FakeST]:
+    """
+    Reemplaza `classifier._get_modelo` por el stub una única vez por sesión,
+    así ningún test descarga los pesos del modelo real.
+    """
+    fake = _FakeST(_encode_por_defecto)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(classifier, "_get_modelo", lambda: fake)
+        yield fake
+
+
+@pytest.fixture
+def fake_model(_install_fake_model: _FakeST, monkeypatch) -> _FakeST:
+    """
+    Stub de la sesión con el contador en cero. Para cambiar los vectores,
+    usar `monkeypatch.setattr(fake_model, "_encode", fn)`: el encode por
+    defecto se restaura solo al terminar el test. La matriz de categorías
+    cacheada se descarta para que se vuelva a encodear con ese `_encode`.
+    """
+    monkeypatch.setattr(_install_fake_model, "call_count", 0)
+    monkeypatch.setattr(classifier, "_matriz_categorias", None)
+    return _install_fake_model
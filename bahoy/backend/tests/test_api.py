@@ -28,7 +28,7 @@ from unittest.mock import AsyncMock, MagicMock, patch
 import pytest
 from fastapi.testclient import TestClient
 
-from app.database import get_db
+from app.database import get_db, get_session_factory
 from app.main import app
 
 
@@ -47,6 +47,17 @@ def _make_db_result(rows: list[Any]) -> MagicMock:
     return result
 
 
+def _make_stream_result(rows: list[Any]) -> MagicMock:
+    """Simula el AsyncResult de db.stream(): entrega las filas en un único lote."""
+
+    async def _partitions(size: int | None = None):
+        yield rows
+
+    result = MagicMock()
+    result.partitions = _partitions
+    return result
+
+
 def _make_orm_event(
     titulo: str = "Obra de teatro",
     es_gratuito: bool = False,
@@ -111,7 +122,8 @@ def api_client():
     Retorna (TestClient, mock_db).
 
     Sobreescribe la dependencia `get_db` con un AsyncMock para que
-    los tests no necesiten una base de datos real.
+    los tests no necesiten una base de datos real. `get_session_factory`
+    devuelve None: sin sesiones extra, todo pasa por el mock.
     Limpia los overrides al finalizar.
     """
     mock_db = AsyncMock()
@@ -120,6 +132,7 @@ def api_client():
         yield mock_db
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_factory] = lambda: None
     with TestClient(app, raise_server_exceptions=True) as client:
         yield client, mock_db
     app.dependency_overrides.clear()
@@ -531,9 +544,9 @@ class TestGetRecommendations:
     def test_recomendaciones_tipo_populares(self, api_client):
         """tipo=populares devuelve lista de recomendaciones."""
         client, mock_db = api_client
-        # recomendar_populares hace 2 queries: interacciones + eventos
+        # recomendar_populares hace 2 queries: interacciones (por cursor) + eventos
+        mock_db.stream.return_value = _make_stream_result([])  # vacío → futuros
         mock_db.execute.side_effect = [
-            _make_db_result([]),   # interacciones (vacío → completa con futuros)
             _make_db_result([_make_orm_event("Popular")]),  # eventos futuros
         ]
 
@@ -544,6 +557,22 @@ class TestGetRecommendations:
         assert resp.status_code == 200
         assert isinstance(resp.json(), list)
 
+    def test_recomendaciones_tipo_hibrido(self, api_client):
+        """tipo=hibrido resuelve ambas fases sobre la sesión inyectada."""
+        client, mock_db = api_client
+        # Sin usuario ni historial ambas fases caen en populares, que tampoco
+        # encuentra eventos: la respuesta sale vacía sin tocar una base real.
+        mock_db.stream.return_value = _make_stream_result([])
+        mock_db.execute.return_value = _make_db_result([])
+
+        resp = client.get(
+            f"/api/recommendations/{uuid.uuid4()}?tipo=hibrido&limite=4"
+        )
+
+        assert resp.status_code == 200
+        assert resp.json() == []
+        assert mock_db.execute.await_count >= 2
+
     def test_recomendaciones_user_id_invalido_422(self, api_client):
         """user_id no UUID devuelve 422."""
         client, mock_db = api_client
@@ -595,10 +624,8 @@ class TestGetRecommendations:
     def test_recomendaciones_limite_valido(self, api_client):
         """El parámetro limite acepta valores entre 1 y 50."""
         client, mock_db = api_client
-        mock_db.execute.side_effect = [
-            _make_db_result([]),
-            _make_db_result([]),
-        ]
+        mock_db.stream.return_value = _make_stream_result([])
+        mock_db.execute.side_effect = [_make_db_result([])]
 
         resp = client.get(
             f"/api/recommendations/{uuid.uuid4()}?tipo=populares&limite=5"
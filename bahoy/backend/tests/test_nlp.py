@@ -17,8 +17,8 @@ Ejecutar:
 
 from __future__ import annotations
 
+import functools
 from datetime import datetime
-from unittest.mock import MagicMock, patch
 
 import numpy as np
 import pytest
@@ -30,14 +30,50 @@ from app.nlp.classifier import (
     _clasificar_por_reglas,
     _detectar_subcategoria,
     _generar_tags,
+    _get_matriz_categorias,
     _normalizar_texto,
-    _similitud_coseno,
     clasificar_evento,
 )
 
 # Dimensión de los embeddings (384 para paraphrase-multilingual-MiniLM-L12-v2)
 NLP_DIM = 384
 
+# Fechas fijas de los tests de _generar_tags (datetime es inmutable).
+_SABADO_0315_2000 = datetime(2025, 3, 15, 20, 0)
+_SABADO_0315_2300 = datetime(2025, 3, 15, 23, 0)
+_SABADO_0315_1959 = datetime(2025, 3, 15, 19, 59)
+_SABADO_1800 = datetime(2025, 7, 5, 18, 0)
+_SABADO_2100 = datetime(2025, 7, 5, 21, 0)
+_DOMINGO_1600 = datetime(2025, 7, 6, 16, 0)
+_LUNES_2000 = datetime(2025, 7, 7, 20, 0)
+
+# El calendario se verifica una sola vez al importar el módulo.
+assert _SABADO_1800.weekday() == 5  # 5 = sábado
+assert _SABADO_2100.weekday() == 5
+assert _DOMINGO_1600.weekday() == 6  # 6 = domingo
+assert _LUNES_2000.weekday() == 0  # 0 = lunes
+
+# Un evento de ejemplo (título, descripción) por categoría, que las reglas
+# deben clasificar sin ambigüedad.
+EVENTOS_POR_CATEGORIA: dict[str, tuple[str, str]] = {
+    "Teatro": ("Gran obra teatral", "Función con actores en escena"),
+    "Música": ("Concierto de jazz", "Show de la banda con recital"),
+    "Exposiciones": ("Exposición de arte", "Muestra en galería con fotografía"),
+    "Gastronomía": ("Degustación gastronómica", "Chef con menú y maridaje"),
+    "Cine": ("Proyección de film", "Ciclo de cine documental en el cine"),
+    "Danza": ("Espectáculo de ballet", "Función con bailarines y coreografía"),
+    "Talleres": ("Taller participativo", "Workshop con curso y capacitación"),
+    "Festivales": ("Gran festival", "Feria y encuentro con jornada cultural"),
+}
+
+# Texto ya normalizado de cada evento de ejemplo, calculado una sola vez al
+# importar. _normalizar_texto es idempotente, así que las reglas lo aceptan
+# como título sin cambiar el resultado.
+_EVENTOS_NORMALIZADOS: list[tuple[str, str]] = [
+    (cat, _normalizar_texto(titulo + " " + desc))
+    for cat, (titulo, desc) in EVENTOS_POR_CATEGORIA.items()
+]
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Helpers
@@ -45,78 +81,51 @@ NLP_DIM = 384
 
 
 def _make_vector(values: list[float]) -> np.ndarray:
-    return np.array(values, dtype=float)
+    return np.asarray(values, dtype=np.float32)
 
 
+@functools.lru_cache(maxsize=None)
 def _normalized_vector(seed: int, dim: int = 384) -> np.ndarray:
-    rng = np.random.default_rng(seed)
-    v = rng.random(dim).astype(float)
-    return v / np.linalg.norm(v)
-
-
-def _mock_sentence_transformer(embed_fn=None):
     """
-    Crea un mock de SentenceTransformer.encode() que retorna
-    vectores deterministas basados en el texto de entrada.
+    Vector unitario float32 determinista para `seed`, memoizado por (seed, dim).
+    Usa float32 como la salida real de sentence-transformers.
+    Se devuelve de solo lectura porque la misma instancia se comparte
+    entre tests; usar `.copy()` si hace falta modificarlo.
     """
-    modelo = MagicMock()
-    if embed_fn is None:
-        # Por defecto, devuelve el mismo vector para cualquier texto
-        modelo.encode.return_value = _normalized_vector(seed=0)
-    else:
-        modelo.encode.side_effect = embed_fn
-    return modelo
+    rng = np.random.default_rng(seed)
+    v = rng.random(dim, dtype=np.float32)
+    v /= np.linalg.norm(v)
+    v.setflags(write=False)
+    return v
 
 
 # ─────────────────────────────────────────────────────────────────────────────
-# Tests: _similitud_coseno
+# Fixtures
 # ─────────────────────────────────────────────────────────────────────────────
+#
+# El modelo de sentence-transformers se reemplaza por un stub (`fake_model`)
+# instalado una vez por sesión desde conftest.py.
 
 
-class TestSimilitudCoseno:
-    """Tests para la función de similitud coseno."""
-
-    def test_vectores_identicos_similitud_uno(self):
-        """Vectores idénticos tienen similitud coseno = 1."""
-        v = _normalized_vector(seed=1)
-        sim = _similitud_coseno(v, v)
-        assert sim == pytest.approx(1.0, abs=1e-6)
-
-    def test_vectores_opuestos_similitud_menos_uno(self):
-        """Vectores opuestos tienen similitud coseno = -1."""
-        v = np.array([1.0, 0.0, 0.0])
-        sim = _similitud_coseno(v, -v)
-        assert sim == pytest.approx(-1.0, abs=1e-6)
-
-    def test_vectores_ortogonales_similitud_cero(self):
-        """Vectores ortogonales tienen similitud coseno = 0."""
-        v1 = np.array([1.0, 0.0])
-        v2 = np.array([0.0, 1.0])
-        sim = _similitud_coseno(v1, v2)
-        assert sim == pytest.approx(0.0, abs=1e-6)
-
-    def test_vector_cero_retorna_cero(self):
-        """Vector cero no divide por cero, retorna 0."""
-        v = np.array([1.0, 2.0, 3.0])
-        cero = np.array([0.0, 0.0, 0.0])
-        sim = _similitud_coseno(v, cero)
-        assert sim == 0.0
-
-    def test_similitud_es_simetrica(self):
-        """sim(a, b) == sim(b, a)."""
-        v1 = _normalized_vector(seed=10)
-        v2 = _normalized_vector(seed=20)
-        assert _similitud_coseno(v1, v2) == pytest.approx(
-            _similitud_coseno(v2, v1), abs=1e-6
-        )
+@pytest.fixture(scope="class")
+def resultado_embeddings(_install_fake_model) -> dict:
+    """
+    Resultado de _clasificar_por_embeddings con el encoder por defecto,
+    calculado una sola vez y compartido por los tests de contrato.
+    """
+    return _clasificar_por_embeddings("texto", "descripción")
 
-    def test_similitud_entre_menos_uno_y_uno(self):
-        """La similitud coseno siempre está en [-1, 1]."""
-        for seed in range(5):
-            v1 = _normalized_vector(seed=seed)
-            v2 = _normalized_vector(seed=seed + 10)
-            sim = _similitud_coseno(v1, v2)
-            assert -1.0 <= sim <= 1.0
+
+@pytest.fixture(scope="class")
+def embeddings_por_categoria() -> dict[str, np.ndarray]:
+    """
+    Embeddings de las descripciones típicas (distintos entre sí),
+    construidos una sola vez por clase de tests.
+    """
+    return {
+        cat: _normalized_vector(seed=i + 10)
+        for i, cat in enumerate(DESCRIPCIONES_TIPICAS.keys())
+    }
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -130,68 +139,76 @@ class TestGeneracionEmbeddings:
     El modelo se mockea para no requerir descarga de pesos.
     """
 
-    def test_clasificar_por_embeddings_retorna_categoria(self):
-        """_clasificar_por_embeddings devuelve una categoría conocida."""
-        categorias_validas = set(DESCRIPCIONES_TIPICAS.keys())
-        embedding_teatro = _normalized_vector(seed=0)
+    def test_clasificar_por_embeddings_resultado(self, resultado_embeddings):
+        """El resultado de _clasificar_por_embeddings cumple el contrato de cada clave."""
+        assert resultado_embeddings["categoria"] in DESCRIPCIONES_TIPICAS
+        confianza = resultado_embeddings["confianza"]
+        assert isinstance(confianza, float) and 0.0 <= confianza <= 1.0
+        assert resultado_embeddings["metodo"] == "embeddings"
+
+    def test_clasificar_por_embeddings_alta_similitud_teatro(
+        self, fake_model, monkeypatch, embeddings_por_categoria
+    ):
+        """
+        Si el embedding del evento es idéntico al de Teatro,
+        la categoría debe ser Teatro con alta confianza.
+        """
+        emb_teatro = embeddings_por_categoria["Teatro"]
 
         def encode_fn(texto):
-            # Mismo embedding para todo texto → categoría arbitraria pero válida
-            return embedding_teatro
+            # Devuelve el embedding de la categoría cuya descripción coincide
+            for cat, desc in DESCRIPCIONES_TIPICAS.items():
+                if desc in texto:
+                    return embeddings_por_categoria[cat]
+            # Para el texto del evento: devuelve el embedding de Teatro
+            return emb_teatro
 
-        with patch("app.nlp.classifier._get_modelo") as mock_get:
-            mock_get.return_value = _mock_sentence_transformer(encode_fn)
-            result = _clasificar_por_embeddings("evento de prueba", "descripción")
+        monkeypatch.setattr(fake_model, "_encode", encode_fn)
+        result = _clasificar_por_embeddings("obra teatral", "función en escena")
 
-        assert result["categoria"] in categorias_validas
+        assert result["categoria"] == "Teatro"
+        np.testing.assert_allclose(result["confianza"], 1.0, atol=1e-5)
 
-    def test_clasificar_por_embeddings_retorna_confianza_flotante(self):
-        """La confianza es un float entre 0 y 1."""
-        with patch("app.nlp.classifier._get_modelo") as mock_get:
-            mock_get.return_value = _mock_sentence_transformer()
-            result = _clasificar_por_embeddings("texto", "descripción")
+    def test_embedding_evento_nulo_confianza_cero(self, fake_model, monkeypatch):
+        """Un evento con vector nulo no divide por cero: similitud 0 con todas."""
+        cero = np.zeros(NLP_DIM, dtype=np.float32)
 
-        assert isinstance(result["confianza"], float)
-        assert 0.0 <= result["confianza"] <= 1.0
+        def encode_fn(texto):
+            if texto in DESCRIPCIONES_TIPICAS.values():
+                return _normalized_vector(seed=1)
+            return cero
 
-    def test_clasificar_por_embeddings_metodo_es_embeddings(self):
-        """El método reportado es 'embeddings'."""
-        with patch("app.nlp.classifier._get_modelo") as mock_get:
-            mock_get.return_value = _mock_sentence_transformer()
-            result = _clasificar_por_embeddings("texto", "descripción")
+        monkeypatch.setattr(fake_model, "_encode", encode_fn)
+        result = _clasificar_por_embeddings("texto", "descripción")
 
-        assert result["metodo"] == "embeddings"
+        # Empate en 0 con todas: gana la primera categoría (argmax), no el
+        # fallback que dejaría una similitud NaN.
+        assert result["categoria"] == next(iter(DESCRIPCIONES_TIPICAS))
+        assert result["confianza"] == 0.0
 
-    def test_clasificar_por_embeddings_alta_similitud_teatro(self):
+    def test_embedding_categoria_nulo_sin_nan(self, fake_model, monkeypatch):
         """
-        Si el embedding del evento es idéntico al de Teatro,
-        la categoría debe ser Teatro con alta confianza.
+        Una categoría con vector nulo queda como fila de ceros (sin NaN) y
+        puntúa 0: gana frente a categorías opuestas al evento.
         """
-        # Embeddings para las categorías (distintos entre sí)
-        emb_teatro = _normalized_vector(seed=1)
-        emb_otros = {
-            cat: _normalized_vector(seed=i + 10)
-            for i, cat in enumerate(DESCRIPCIONES_TIPICAS.keys())
-            if cat != "Teatro"
-        }
-        emb_otros["Teatro"] = emb_teatro
+        emb_evento = _normalized_vector(seed=1)
+        desc_teatro = DESCRIPCIONES_TIPICAS["Teatro"]
 
         def encode_fn(texto):
-            # Devuelve el embedding de la categoría cuya descripción coincide
-            for cat, desc in DESCRIPCIONES_TIPICAS.items():
-                if desc in texto:
-                    return emb_otros.get(cat, _normalized_vector(seed=99))
-            # Para el texto del evento: devuelve el embedding de Teatro
-            return emb_teatro
+            if texto == desc_teatro:
+                return np.zeros(NLP_DIM, dtype=np.float32)
+            if texto in DESCRIPCIONES_TIPICAS.values():
+                return -emb_evento
+            return emb_evento
 
-        with patch("app.nlp.classifier._get_modelo") as mock_get:
-            mock_get.return_value = _mock_sentence_transformer(encode_fn)
-            result = _clasificar_por_embeddings("obra teatral", "función en escena")
+        monkeypatch.setattr(fake_model, "_encode", encode_fn)
+        result = _clasificar_por_embeddings("texto", "descripción")
 
+        assert not np.isnan(_get_matriz_categorias()).any()
         assert result["categoria"] == "Teatro"
-        assert result["confianza"] == pytest.approx(1.0, abs=1e-6)
+        assert result["confianza"] == 0.0
 
-    def test_fallback_a_embeddings_cuando_reglas_son_ambiguas(self):
+    def test_fallback_a_embeddings_cuando_reglas_son_ambiguas(self, fake_model):
         """
         Si las reglas son ambiguas (empate), se usa el clasificador por embeddings.
         """
@@ -202,25 +219,25 @@ class TestGeneracionEmbeddings:
         con_reglas = _clasificar_por_reglas(titulo, descripcion)
         # Puede ser None (empate) o un resultado con baja confianza
 
-        with patch("app.nlp.classifier._get_modelo") as mock_get:
-            mock_get.return_value = _mock_sentence_transformer()
-            result = clasificar_evento(titulo, descripcion)
+        result = clasificar_evento(titulo, descripcion)
 
         # Siempre debe retornar una categoría
         assert result["categoria"] is not None
         assert result["metodo"] in ("reglas", "embeddings")
 
-    def test_embedding_encode_llamado_con_texto(self):
+    def test_embedding_encode_llamado_con_texto(self, fake_model):
         """El modelo recibe el texto correcto para encodear."""
-        mock_modelo = _mock_sentence_transformer()
-        mock_modelo.encode.return_value = _normalized_vector(seed=0)
-
-        with patch("app.nlp.classifier._get_modelo") as mock_get:
-            mock_get.return_value = mock_modelo
-            _clasificar_por_embeddings("Mi evento", "Mi descripción")
+        _clasificar_por_embeddings("Mi evento", "Mi descripción")
 
         # encode fue llamado al menos una vez
-        assert mock_modelo.encode.call_count >= 1
+        assert fake_model.call_count >= 1
+
+    def test_descripciones_de_categorias_se_encodean_una_vez(self, fake_model):
+        """Las categorías se encodean en la primera llamada; luego solo el evento."""
+        _clasificar_por_embeddings("Primer evento", "descripción")
+        _clasificar_por_embeddings("Segundo evento", "descripción")
+
+        assert fake_model.call_count == len(DESCRIPCIONES_TIPICAS) + 2
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -250,35 +267,27 @@ class TestPipelineCompleto:
         assert result["categoria"] == "Música"
         assert result["metodo"] == "reglas"
 
-    def test_evento_ambiguo_usa_embeddings(self):
+    def test_evento_ambiguo_usa_embeddings(self, fake_model):
         """Evento sin keywords claras → intenta embeddings."""
-        with patch("app.nlp.classifier._get_modelo") as mock_get:
-            mock_get.return_value = _mock_sentence_transformer()
-            result = clasificar_evento(
-                "Propuesta única e irrepetible",
-                "Una experiencia diferente en el centro porteño.",
-            )
+        result = clasificar_evento(
+            "Propuesta única e irrepetible",
+            "Una experiencia diferente en el centro porteño.",
+        )
         assert result["categoria"] is not None
         assert result["metodo"] in ("reglas", "embeddings")
 
-    def test_todas_las_categorias_clasificables(self):
+    @pytest.mark.parametrize(
+        "categoria_esperada,texto",
+        _EVENTOS_NORMALIZADOS,
+        ids=[cat for cat, _ in _EVENTOS_NORMALIZADOS],
+    )
+    def test_todas_las_categorias_clasificables(self, categoria_esperada, texto):
         """Cada categoría del diccionario tiene al menos un evento que la activa."""
-        eventos_por_categoria = {
-            "Teatro": ("Gran obra teatral", "Función con actores en escena"),
-            "Música": ("Concierto de jazz", "Show de la banda con recital"),
-            "Exposiciones": ("Exposición de arte", "Muestra en galería con fotografía"),
-            "Gastronomía": ("Degustación gastronómica", "Chef con menú y maridaje"),
-            "Cine": ("Proyección de film", "Ciclo de cine documental en el cine"),
-            "Danza": ("Espectáculo de ballet", "Función con bailarines y coreografía"),
-            "Talleres": ("Taller participativo", "Workshop con curso y capacitación"),
-            "Festivales": ("Gran festival", "Feria y encuentro con jornada cultural"),
-        }
-        for categoria_esperada, (titulo, desc) in eventos_por_categoria.items():
-            result = _clasificar_por_reglas(titulo, desc)
-            assert result is not None, (
-                f"Las reglas no clasificaron '{titulo}' como '{categoria_esperada}'"
-            )
-            assert result["categoria"] == categoria_esperada
+        result = _clasificar_por_reglas(texto, "")
+        assert result is not None, (
+            f"Las reglas no clasificaron '{texto}' como '{categoria_esperada}'"
+        )
+        assert result["categoria"] == categoria_esperada
 
     def test_resultado_tiene_todas_las_claves(self):
         """clasificar_evento siempre retorna un dict con las 5 claves."""
@@ -382,20 +391,17 @@ class TestExtraccionEntidades:
 
     def test_entidad_nocturno_a_las_20(self):
         """Hora >= 20:00 → entidad 'nocturno'."""
-        fecha = datetime(2025, 3, 15, 20, 0)
-        tags = _generar_tags("Show", "Función de noche", fecha=fecha)
+        tags = _generar_tags("Show", "Función de noche", fecha=_SABADO_0315_2000)
         assert "nocturno" in tags
 
     def test_entidad_nocturno_a_las_23(self):
         """23:00 también es nocturno."""
-        fecha = datetime(2025, 3, 15, 23, 0)
-        tags = _generar_tags("DJ Set", "Electrónica", fecha=fecha)
+        tags = _generar_tags("DJ Set", "Electrónica", fecha=_SABADO_0315_2300)
         assert "nocturno" in tags
 
     def test_no_entidad_nocturno_a_las_19(self):
         """19:59 no es nocturno (umbral en 20:00)."""
-        fecha = datetime(2025, 3, 15, 19, 59)
-        tags = _generar_tags("Teatro", "Función de tarde", fecha=fecha)
+        tags = _generar_tags("Teatro", "Función de tarde", fecha=_SABADO_0315_1959)
         assert "nocturno" not in tags
 
     def test_no_entidad_nocturno_sin_fecha(self):
@@ -407,26 +413,17 @@ class TestExtraccionEntidades:
 
     def test_entidad_fin_de_semana_sabado(self):
         """Sábado → entidad 'fin de semana'."""
-        # 2025-07-05 es sábado
-        fecha = datetime(2025, 7, 5, 18, 0)
-        assert fecha.weekday() == 5  # 5 = sábado
-        tags = _generar_tags("Ballet", "Función especial", fecha=fecha)
+        tags = _generar_tags("Ballet", "Función especial", fecha=_SABADO_1800)
         assert "fin de semana" in tags
 
     def test_entidad_fin_de_semana_domingo(self):
         """Domingo → entidad 'fin de semana'."""
-        # 2025-07-06 es domingo
-        fecha = datetime(2025, 7, 6, 16, 0)
-        assert fecha.weekday() == 6  # 6 = domingo
-        tags = _generar_tags("Ballet", "Función especial", fecha=fecha)
+        tags = _generar_tags("Ballet", "Función especial", fecha=_DOMINGO_1600)
         assert "fin de semana" in tags
 
     def test_no_entidad_fin_de_semana_entre_semana(self):
         """Lunes a viernes → sin 'fin de semana'."""
-        # 2025-07-07 es lunes
-        fecha = datetime(2025, 7, 7, 20, 0)
-        assert fecha.weekday() == 0  # 0 = lunes
-        tags = _generar_tags("Taller", "Clase regular", fecha=fecha)
+        tags = _generar_tags("Taller", "Clase regular", fecha=_LUNES_2000)
         assert "fin de semana" not in tags
 
     # ── Combinaciones ──────────────────────────────────────────────────────────
@@ -434,12 +431,11 @@ class TestExtraccionEntidades:
     def test_multiples_entidades_simultaneas(self):
         """Evento que activa todas las entidades a la vez."""
         # Sábado 21hs, gratis, al aire libre, para niños
-        fecha = datetime(2025, 7, 5, 21, 0)  # sábado
         tags = _generar_tags(
             "Gran Festival Infantil en el Parque",
             "Para toda la familia. Entrada gratis en el parque al aire libre.",
             precio=0.0,
-            fecha=fecha,
+            fecha=_SABADO_2100,
         )
         assert "gratuito" in tags
         assert "familiar" in tags
@@ -460,12 +456,11 @@ class TestExtraccionEntidades:
 
     def test_no_duplicados_en_tags(self):
         """No hay tags duplicados en la lista."""
-        fecha = datetime(2025, 7, 5, 21, 0)
         tags = _generar_tags(
             "Festival gratis al aire libre",
             "gratis gratis gratis en parque parque",
             precio=0.0,
-            fecha=fecha,
+            fecha=_SABADO_2100,
         )
         assert len(tags) == len(set(tags))
 
@@ -8,6 +8,9 @@ Cubre:
   - recomendar_hibrido (Fase 1 + Fase 2)
 
 Los tests usan mocks de AsyncSession para evitar dependencia de base de datos.
+Los tests async no llevan @pytest.mark.asyncio: pytest.ini fija
+asyncio_mode = auto y un único event loop por sesión (pytest-asyncio 1.x,
+que ya no admite redefinir el fixture event_loop).
 
 Ejecutar con:
     cd bahoy/backend
@@ -16,145 +19,320 @@ Ejecutar con:
 
 from __future__ import annotations
 
+import asyncio
+import functools
+import operator
+import os
 import uuid
-from datetime import datetime, timedelta, timezone
+from collections import deque
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta, timezone
 from decimal import Decimal
 from typing import Any
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import numpy as np
 import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.models.event import EMBEDDING_DIMENSION
 from app.models.interaction import InteractionType
-from app.services.recommender import RecommenderService, _PESOS_CONTENIDO
+from app.services.recommender import (
+    RecommenderService,
+    _PESOS_CONTENIDO,
+    _cache_perfiles,
+    _cache_preferencias,
+    _indices_top_k,
+    _rangos_del_dia,
+    _ultimos_resultados,
+    invalidar_perfil,
+    invalidar_preferencias,
+)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
-# Helpers para construir mocks
+# Helpers para construir objetos de prueba
 # ─────────────────────────────────────────────────────────────────────────────
 
 
+# Pool de UUIDs: una lectura de os.urandom por lote en lugar de una por UUID.
+# Los tests solo comparan UUIDs por igualdad, así que ``UUID(bytes=...)``
+# alcanza: no hace falta fijar los bits de versión y variante de uuid4().
+_TAMANO_LOTE_UUID = 1024
+_UUID_POOL: deque[uuid.UUID] = deque()
+
+
+def _rellenar_uuid_pool() -> None:
+    buf = os.urandom(16 * _TAMANO_LOTE_UUID)
+    _UUID_POOL.extend(
+        uuid.UUID(bytes=buf[i : i + 16]) for i in range(0, len(buf), 16)
+    )
+
+
 def _uuid() -> uuid.UUID:
-    return uuid.uuid4()
+    if not _UUID_POOL:
+        _rellenar_uuid_pool()
+    return _UUID_POOL.popleft()
+
+
+# Dimensión por defecto de los embeddings de prueba. El servicio no depende
+# de la dimensión; solo un test usa EMBEDDING_DIMENSION para cubrir la real.
+_DIM = 16
+
+
+# Matriz de vectores aleatorios generada una sola vez: cada seed toma una fila
+# (módulo el tamaño del pool) en lugar de crear un Generator por llamada.
+_EMB_POOL_SIZE = 256
+_EMB_POOL = np.random.default_rng(0).random(
+    (_EMB_POOL_SIZE, EMBEDDING_DIMENSION), dtype=np.float32
+)
+_EMB_POOL.setflags(write=False)
+
+
+@functools.lru_cache(maxsize=None)
+def _emb_cached(seed: int, dim: int) -> tuple[float, ...]:
+    """
+    Embedding normalizado como tupla inmutable de floats de Python, cacheado
+    por ``(seed, dim)``. Se normaliza en float32 a partir del pool.
+    """
+    v = _EMB_POOL[seed % _EMB_POOL_SIZE, :dim]
+    return tuple((v / np.linalg.norm(v)).tolist())
+
+
+def _emb(seed: int = 0, dim: int = _DIM) -> list[float]:
+    """Copia en lista (floats de Python) del embedding determinista de la ``seed``."""
+    return list(_emb_cached(seed, dim))
+
+
+def _emb_batch(n: int, dim: int = _DIM, inicio: int = 0) -> list[list[float]]:
+    """
+    Embeddings de las seeds ``inicio .. inicio + n - 1`` en una sola pasada:
+    toma las filas del pool (módulo su tamaño, igual que ``_emb_cached``) y
+    normaliza todas juntas.
+    """
+    filas = np.arange(inicio, inicio + n) % _EMB_POOL_SIZE
+    bloque = _EMB_POOL[filas, :dim]
+    return (bloque / np.linalg.norm(bloque, axis=1, keepdims=True)).tolist()
+
+
+# Stand-ins planos (sin MagicMock) con exactamente los atributos que lee el
+# servicio. ``slots=True`` evita el ``__dict__`` por instancia.
+
+
+@dataclass(slots=True)
+class _FakeCategory:
+    nombre: str
+    id: uuid.UUID = field(default_factory=_uuid)
+
+
+@dataclass(slots=True)
+class _FakeVenue:
+    barrio: str
+    nombre: str = "Teatro San Martín"
+    direccion: str = "Corrientes 1530"
+    id: uuid.UUID = field(default_factory=_uuid)
+
+
+@dataclass(slots=True)
+class _FakeEvent:
+    titulo: str
+    embedding: list[float] | None
+    categoria: _FakeCategory
+    categoria_id: uuid.UUID
+    venue: _FakeVenue
+    es_gratuito: bool
+    precio_min: Decimal | None
+    tags: list[str]
+    fecha_inicio: datetime
+    descripcion: str = "Descripción de prueba"
+    precio_max: Decimal | None = None
+    subcategorias: list[str] = field(default_factory=list)
+    imagen_url: str | None = None
+    url_fuente: str | None = None
+    fecha_fin: datetime | None = None
+    id: uuid.UUID = field(default_factory=_uuid)
+
+
+@dataclass(slots=True)
+class _FakeUser:
+    preferencias: dict[str, Any] | None
+    email: str = "test@bahoy.ar"
+    nombre: str = "Usuario Prueba"
+    id: uuid.UUID = field(default_factory=_uuid)
+
+
+@dataclass(slots=True)
+class _FakeInteraction:
+    tipo: InteractionType
+    user_id: uuid.UUID
+    event_id: uuid.UUID
+    id: uuid.UUID = field(default_factory=_uuid)
+
+
+@dataclass(slots=True)
+class _FakeFilaPopularidad:
+    """Fila de interacciones agrupadas que consume recomendar_populares."""
+
+    event_id: uuid.UUID
+    tipo: InteractionType
+    n: int
+
+
+def make_category(nombre: str = "Teatro") -> _FakeCategory:
+    return _FakeCategory(nombre=nombre)
 
 
-def _emb(seed: int = 0, dim: int = 384) -> list[float]:
-    """Genera un embedding determinista de dimensión `dim`."""
-    rng = np.random.default_rng(seed)
-    v = rng.random(dim).astype(float)
-    return (v / np.linalg.norm(v)).tolist()
+def make_venue(barrio: str = "Palermo") -> _FakeVenue:
+    return _FakeVenue(barrio=barrio)
 
 
-def make_category(nombre: str = "Teatro") -> MagicMock:
-    cat = MagicMock()
-    cat.id = _uuid()
-    cat.nombre = nombre
-    return cat
+# Instante de referencia fijado al importar el módulo: las fechas de los
+# eventos de prueba son relativas a "ahora" con resolución de días, así que
+# no hace falta consultar el reloj en cada make_event.
+_AHORA_UTC = datetime.now(timezone.utc)
 
 
-def make_venue(barrio: str = "Palermo") -> MagicMock:
-    venue = MagicMock()
-    venue.id = _uuid()
-    venue.nombre = "Teatro San Martín"
-    venue.barrio = barrio
-    venue.direccion = "Corrientes 1530"
-    return venue
+@functools.lru_cache(maxsize=None)
+def _decimal_desde_float(valor: float) -> Decimal:
+    return Decimal(str(valor))
+
+
+def _a_decimal(valor: float | Decimal | None) -> Decimal | None:
+    """Convierte un precio a Decimal; los Decimal pasan tal cual y los float se cachean."""
+    if valor is None or isinstance(valor, Decimal):
+        return valor
+    return _decimal_desde_float(valor)
 
 
 def make_event(
     *,
     titulo: str = "Evento de prueba",
     embedding: list[float] | None = None,
-    categoria: MagicMock | None = None,
-    venue: MagicMock | None = None,
+    categoria: _FakeCategory | None = None,
+    venue: _FakeVenue | None = None,
     es_gratuito: bool = False,
-    precio_min: float | None = None,
+    precio_min: float | Decimal | None = None,
     tags: list[str] | None = None,
     dias_futuro: int = 7,
-) -> MagicMock:
-    """Crea un mock de Event con los atributos mínimos necesarios."""
+) -> _FakeEvent:
+    """Crea un Event de prueba con los atributos mínimos necesarios."""
     cat = categoria or make_category()
-    event = MagicMock()
-    event.id = _uuid()
-    event.titulo = titulo
-    event.descripcion = "Descripción de prueba"
-    event.embedding = embedding
-    event.categoria = cat
-    event.categoria_id = cat.id
-    event.venue = venue or make_venue()
-    event.es_gratuito = es_gratuito
-    event.precio_min = Decimal(str(precio_min)) if precio_min is not None else None
-    event.precio_max = None
-    event.tags = tags or []
-    event.subcategorias = []
-    event.imagen_url = None
-    event.url_fuente = None
-    event.fecha_inicio = datetime.now(timezone.utc) + timedelta(days=dias_futuro)
-    event.fecha_fin = None
-    return event
+    return _FakeEvent(
+        titulo=titulo,
+        embedding=embedding,
+        categoria=cat,
+        categoria_id=cat.id,
+        venue=venue or make_venue(),
+        es_gratuito=es_gratuito,
+        precio_min=_a_decimal(precio_min),
+        tags=tags or [],
+        fecha_inicio=_AHORA_UTC + timedelta(days=dias_futuro),
+    )
+
+
+def fila_evento(event: _FakeEvent) -> dict[str, Any]:
+    """Fila de ``_select_filas_evento`` (columnas con etiqueta) para un evento."""
+    return {
+        "id": event.id,
+        "titulo": event.titulo,
+        "descripcion": event.descripcion,
+        "categoria": event.categoria.nombre,
+        "subcategorias": event.subcategorias,
+        "fecha_inicio": event.fecha_inicio,
+        "fecha_fin": event.fecha_fin,
+        "venue_id": event.venue.id,
+        "venue_nombre": event.venue.nombre,
+        "venue_barrio": event.venue.barrio,
+        "venue_direccion": event.venue.direccion,
+        "precio_min": event.precio_min,
+        "precio_max": event.precio_max,
+        "es_gratuito": event.es_gratuito,
+        "imagen_url": event.imagen_url,
+        "url_fuente": event.url_fuente,
+        "tags": event.tags,
+    }
 
 
 def make_user(
     *,
     preferencias: dict[str, Any] | None = None,
-) -> MagicMock:
-    user = MagicMock()
-    user.id = _uuid()
-    user.email = "test@bahoy.ar"
-    user.nombre = "Usuario Prueba"
-    user.preferencias = preferencias
-    return user
+) -> _FakeUser:
+    return _FakeUser(preferencias=preferencias)
 
 
 def make_interaction(
     tipo: InteractionType,
     user_id: uuid.UUID,
     event_id: uuid.UUID,
-) -> MagicMock:
-    inter = MagicMock()
-    inter.id = _uuid()
-    inter.user_id = user_id
-    inter.event_id = event_id
-    inter.tipo = tipo
-    return inter
+) -> _FakeInteraction:
+    return _FakeInteraction(tipo=tipo, user_id=user_id, event_id=event_id)
 
 
-def _make_db_result(rows: list[Any]) -> MagicMock:
+class _FakeResult:
     """
-    Simula el resultado de db.execute().
+    Resultado mínimo de db.execute() sin maquinaria de MagicMock.
     - .all()                → rows (para selects de columnas individuales)
     - .scalars().all()      → rows (para selects de modelos ORM)
+    - .mappings().all()     → rows (para selects de columnas con etiqueta)
+    - .partitions()         → un único lote con rows (para db.stream)
     - .scalar_one_or_none() → rows[0] if rows else None
     """
-    result = MagicMock()
-    result.all.return_value = rows
-    scalars_mock = MagicMock()
-    scalars_mock.all.return_value = rows
-    result.scalars.return_value = scalars_mock
-    result.scalar_one_or_none.return_value = rows[0] if rows else None
-    return result
+
+    __slots__ = ("_rows",)
+
+    def __init__(self, rows: list[Any]) -> None:
+        self._rows = rows
+
+    def all(self) -> list[Any]:
+        return self._rows
+
+    def scalars(self) -> _FakeResult:
+        return self
+
+    def mappings(self) -> _FakeResult:
+        return self
+
+    async def partitions(self, size: int | None = None) -> AsyncIterator[list[Any]]:
+        yield self._rows
+
+    def scalar_one_or_none(self) -> Any:
+        return self._rows[0] if self._rows else None
+
+
+# Simula el resultado de db.execute() con las filas dadas. Es la clase misma:
+# construir el resultado no agrega un frame intermedio por llamada.
+_make_db_result = _FakeResult
 
 
 def make_async_db(*execute_returns: Any) -> AsyncMock:
     """
     Crea un AsyncMock de AsyncSession.
-    Si se pasa más de un argumento, `execute` devuelve cada valor en orden
-    (side_effect). Si se pasa uno solo, siempre devuelve ese valor.
+    `execute` y `stream` comparten la cola: devuelven cada valor en orden;
+    agotados, repiten el último. Con un único argumento, siempre ese valor.
     """
-    db = AsyncMock()
-    if len(execute_returns) == 1:
-        db.execute.return_value = execute_returns[0]
-    else:
-        db.execute.side_effect = list(execute_returns)
+    db = AsyncMock(spec=AsyncSession)
+    pendientes = deque(execute_returns)
+    ultimo = execute_returns[-1] if execute_returns else None
+
+    async def _execute(*args: Any, **kwargs: Any) -> Any:
+        return pendientes.popleft() if pendientes else ultimo
+
+    db.execute.side_effect = _execute
+    db.stream.side_effect = _execute
     return db
 
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Fixtures de usuarios de prueba con distintos historiales
 # ─────────────────────────────────────────────────────────────────────────────
+# Son datos puros que ningún test ni el servicio modifican: se construyen una
+# vez por módulo y se comparten.
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def usuario_teatro():
     """Usuario con historial exclusivo de teatro."""
     return make_user(
@@ -167,19 +345,19 @@ def usuario_teatro():
     )
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def usuario_musica():
     """Usuario con historial exclusivo de música y sin preferencias explícitas."""
     return make_user(preferencias={})
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def usuario_sin_historial():
     """Usuario recién creado, sin interacciones ni preferencias."""
     return make_user(preferencias=None)
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def usuario_hibrido():
     """Usuario con preferencias explícitas Y historial implícito."""
     return make_user(
@@ -192,6 +370,59 @@ def usuario_hibrido():
     )
 
 
+@pytest.fixture(autouse=True)
+def _sin_caches_de_usuario():
+    """
+    Vacía las cachés de preferencias, perfiles y últimos resultados antes de
+    cada test: los usuarios de módulo se reutilizan y una entrada cacheada
+    correría la cola de make_async_db.
+    """
+    _cache_preferencias.clear()
+    _cache_perfiles.clear()
+    _ultimos_resultados.clear()
+
+
+@pytest.fixture
+def congelar_reloj(monkeypatch):
+    """
+    Fija el ``datetime.now`` que ve el servicio en el instante pedido. Las
+    franjas "hoy" y "esta noche" dependen de la hora: sin congelar el reloj,
+    los tests que corren cerca de la medianoche UTC cambian de resultado.
+    """
+
+    def congelar(instante: datetime) -> None:
+        class _RelojFijo(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return instante if tz is None else instante.astimezone(tz)
+
+        monkeypatch.setattr("app.services.recommender.datetime", _RelojFijo)
+
+    return congelar
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Fixtures de categorías compartidas
+# ─────────────────────────────────────────────────────────────────────────────
+# Los tests solo leen id y nombre. El servicio compara categorías en
+# minúsculas, así que "Teatro" también coincide con la preferencia "teatro".
+
+
+@pytest.fixture(scope="module")
+def cat_teatro():
+    return make_category("Teatro")
+
+
+@pytest.fixture(scope="module")
+def cat_cine():
+    return make_category("Cine")
+
+
+@pytest.fixture(scope="module")
+def cat_musica():
+    return make_category("Música")
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Tests: calcular_perfil_usuario
 # ─────────────────────────────────────────────────────────────────────────────
@@ -200,7 +431,6 @@ def usuario_hibrido():
 class TestCalcularPerfilUsuario:
     """Verifica que el perfil del usuario se calcule correctamente."""
 
-    @pytest.mark.asyncio
     async def test_sin_interacciones_retorna_none(self, usuario_teatro):
         """Sin interacciones en la DB, el método debe retornar None."""
         db = make_async_db(_make_db_result([]))
@@ -210,24 +440,23 @@ class TestCalcularPerfilUsuario:
 
         assert perfil is None
 
-    @pytest.mark.asyncio
     async def test_sin_embeddings_retorna_none(self, usuario_teatro):
         """Interacciones presentes pero sin embeddings en los eventos → None."""
-        # La query filtra Event.embedding IS NOT NULL en la DB;
-        # si la DB no devuelve filas, el resultado sigue siendo None.
-        db = make_async_db(_make_db_result([]))
+        # SUM(embedding) es NULL y COUNT(embedding) es 0 para el tipo.
+        db = make_async_db(
+            _make_db_result([(InteractionType.VISTA, [_uuid()], None, 0)])
+        )
         service = RecommenderService(db)
 
         perfil = await service.calcular_perfil_usuario(str(usuario_teatro.id))
 
         assert perfil is None
 
-    @pytest.mark.asyncio
     async def test_una_interaccion_retorna_embedding_del_evento(self, usuario_musica):
         """Con una sola interacción, el perfil debe igualar el embedding del evento."""
-        emb = _emb(seed=42)
-        # La query retorna (tipo, embedding) por fila
-        filas = [(InteractionType.VISTA, emb)]
+        emb = _emb(seed=42, dim=EMBEDDING_DIMENSION)
+        # La query retorna (tipo, event_ids, SUM(embedding), COUNT(embedding))
+        filas = [(InteractionType.VISTA, [_uuid()], emb, 1)]
         db = make_async_db(_make_db_result(filas))
         service = RecommenderService(db)
 
@@ -237,7 +466,6 @@ class TestCalcularPerfilUsuario:
         assert len(perfil) == len(emb)
         np.testing.assert_allclose(perfil, emb, rtol=1e-6)
 
-    @pytest.mark.asyncio
     async def test_promedio_ponderado_dos_interacciones(self, usuario_teatro):
         """
         Dos interacciones con diferentes pesos → promedio ponderado correcto.
@@ -247,36 +475,58 @@ class TestCalcularPerfilUsuario:
         emb1 = _emb(seed=1)
         emb2 = _emb(seed=2)
         filas = [
-            (InteractionType.GUARDADO, emb1),
-            (InteractionType.VISTA, emb2),
+            (InteractionType.GUARDADO, [_uuid()], emb1, 1),
+            (InteractionType.VISTA, [_uuid()], emb2, 1),
         ]
         db = make_async_db(_make_db_result(filas))
         service = RecommenderService(db)
 
         perfil = await service.calcular_perfil_usuario(str(usuario_teatro.id))
 
-        esperado = (
-            np.array(emb1) * _PESOS_CONTENIDO[InteractionType.GUARDADO]
-            + np.array(emb2) * _PESOS_CONTENIDO[InteractionType.VISTA]
-        ) / (
-            _PESOS_CONTENIDO[InteractionType.GUARDADO]
-            + _PESOS_CONTENIDO[InteractionType.VISTA]
+        esperado = np.average(
+            np.stack([emb1, emb2]),
+            axis=0,
+            weights=[
+                _PESOS_CONTENIDO[InteractionType.GUARDADO],
+                _PESOS_CONTENIDO[InteractionType.VISTA],
+            ],
         )
 
         assert perfil is not None
         np.testing.assert_allclose(perfil, esperado.tolist(), rtol=1e-6)
 
-    @pytest.mark.asyncio
+    async def test_agregado_con_varias_interacciones_del_mismo_tipo(
+        self, usuario_teatro
+    ):
+        """
+        Una fila agregada (tipo, ids, suma, cantidad) equivale a sus interacciones
+        individuales: 2 guardados + 1 vista → (3*(e1+e2) + e3) / 7.
+        """
+        emb1, emb2, emb3 = _emb(seed=1), _emb(seed=2), _emb(seed=3)
+        suma_guardados = (np.array(emb1) + np.array(emb2)).tolist()
+        filas = [
+            (InteractionType.GUARDADO, [_uuid()], suma_guardados, 2),
+            (InteractionType.VISTA, [_uuid()], emb3, 1),
+        ]
+        db = make_async_db(_make_db_result(filas))
+        service = RecommenderService(db)
+
+        perfil = await service.calcular_perfil_usuario(str(usuario_teatro.id))
+
+        esperado = np.average(np.stack([emb1, emb2, emb3]), axis=0, weights=[3, 3, 1])
+        assert perfil is not None
+        np.testing.assert_allclose(perfil, esperado, rtol=1e-5)
+
     async def test_pesos_segun_tipo_interaccion(self, usuario_teatro):
         """
         Verificar que guardado > clic > vista en influencia sobre el perfil.
         """
-        emb_guardado = np.ones(384, dtype=float).tolist()   # vector de 1s
-        emb_vista = np.zeros(384, dtype=float).tolist()     # vector de 0s
+        emb_guardado = [1.0] * _DIM   # vector de 1s
+        emb_vista = [0.0] * _DIM      # vector de 0s
 
         filas = [
-            (InteractionType.GUARDADO, emb_guardado),  # peso 3
-            (InteractionType.VISTA, emb_vista),         # peso 1
+            (InteractionType.GUARDADO, [_uuid()], emb_guardado, 1),  # peso 3
+            (InteractionType.VISTA, [_uuid()], emb_vista, 1),        # peso 1
         ]
         db = make_async_db(_make_db_result(filas))
         service = RecommenderService(db)
@@ -285,18 +535,17 @@ class TestCalcularPerfilUsuario:
 
         # El perfil debe ser (3*1 + 1*0) / 4 = 0.75
         assert perfil is not None
-        assert all(abs(v - 0.75) < 1e-6 for v in perfil)
+        np.testing.assert_allclose(perfil, 0.75, rtol=0, atol=1e-6)
 
-    @pytest.mark.asyncio
     async def test_multiples_tipos_de_interaccion(self, usuario_hibrido):
         """Todos los tipos de interacción contribuyen con sus pesos correctos."""
         emb = _emb(seed=99)
         filas = [
-            (InteractionType.GUARDADO, emb),
-            (InteractionType.ASISTIO, emb),
-            (InteractionType.COMPARTIDO, emb),
-            (InteractionType.CLIC, emb),
-            (InteractionType.VISTA, emb),
+            (InteractionType.GUARDADO, [_uuid()], emb, 1),
+            (InteractionType.ASISTIO, [_uuid()], emb, 1),
+            (InteractionType.COMPARTIDO, [_uuid()], emb, 1),
+            (InteractionType.CLIC, [_uuid()], emb, 1),
+            (InteractionType.VISTA, [_uuid()], emb, 1),
         ]
         db = make_async_db(_make_db_result(filas))
         service = RecommenderService(db)
@@ -307,17 +556,19 @@ class TestCalcularPerfilUsuario:
         assert perfil is not None
         np.testing.assert_allclose(perfil, emb, rtol=1e-6)
 
-    @pytest.mark.asyncio
     async def test_retorna_lista_de_floats(self, usuario_teatro):
         """El perfil retornado debe ser una lista de floats, no un ndarray."""
-        filas = [(InteractionType.CLIC, _emb(seed=5))]
+        filas = [(InteractionType.CLIC, [_uuid()], _emb(seed=5), 1)]
         db = make_async_db(_make_db_result(filas))
         service = RecommenderService(db)
 
         perfil = await service.calcular_perfil_usuario(str(usuario_teatro.id))
 
         assert isinstance(perfil, list)
-        assert all(isinstance(v, float) for v in perfil)
+        # Sale de ndarray.tolist(): la lista es homogénea, alcanza con revisar
+        # el tipo de un elemento (float de Python, no np.float32).
+        assert len(perfil) == _DIM
+        assert type(perfil[0]) is float
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -328,10 +579,9 @@ class TestCalcularPerfilUsuario:
 class TestBuscarPorPerfil:
     """Verifica la búsqueda por similitud vectorial."""
 
-    @pytest.mark.asyncio
     async def test_retorna_eventos_futuros(self, usuario_teatro):
         """Debe retornar la lista de eventos que devuelve la DB."""
-        eventos = [make_event(embedding=_emb(i)) for i in range(3)]
+        eventos = [make_event(embedding=emb) for emb in _emb_batch(3)]
         db = make_async_db(_make_db_result(eventos))
         service = RecommenderService(db)
 
@@ -339,7 +589,6 @@ class TestBuscarPorPerfil:
 
         assert resultado == eventos
 
-    @pytest.mark.asyncio
     async def test_sin_resultados_retorna_lista_vacia(self, usuario_musica):
         """Cuando la DB no retorna eventos, el resultado es lista vacía."""
         db = make_async_db(_make_db_result([]))
@@ -349,7 +598,6 @@ class TestBuscarPorPerfil:
 
         assert resultado == []
 
-    @pytest.mark.asyncio
     async def test_excluir_ids_se_pasa_a_la_query(self, usuario_teatro):
         """
         La exclusión de IDs se aplica como filtro en la query.
@@ -365,7 +613,6 @@ class TestBuscarPorPerfil:
         assert db.execute.called
         assert resultado == [evento]
 
-    @pytest.mark.asyncio
     async def test_lista_excluir_vacia_no_falla(self, usuario_teatro):
         """excluir=[] no debe lanzar excepciones."""
         db = make_async_db(_make_db_result([]))
@@ -375,6 +622,39 @@ class TestBuscarPorPerfil:
 
         assert resultado == []
 
+    async def test_embedding_de_candidatos_no_se_transfiere(self, usuario_teatro):
+        """El embedding solo aparece en el ORDER BY, no entre las columnas leídas."""
+        db = make_async_db(_make_db_result([]))
+        service = RecommenderService(db)
+
+        await service.buscar_por_perfil(_emb(seed=5), excluir=[])
+
+        sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+        columnas, _, resto = sql.partition("FROM")
+        assert "events.embedding" not in columnas
+        assert "ORDER BY CAST(events.embedding AS HALFVEC(384)) <=>" in resto
+
+    async def test_max_por_categoria_diversifica_en_sql(self, usuario_teatro):
+        """
+        Con max_por_categoria, la query numera los vecinos por categoría con
+        ROW_NUMBER() sobre el top-K por distancia y filtra por ese tope.
+        """
+        db = make_async_db(_make_db_result([]))
+        service = RecommenderService(db)
+
+        await service.buscar_por_perfil(
+            _emb(seed=4), excluir=[], limite=12, max_por_categoria=3
+        )
+
+        compilado = db.execute.await_args.args[0].compile(
+            dialect=postgresql.dialect()
+        )
+        sql = str(compilado)
+        assert "row_number() OVER (PARTITION BY" in sql
+        assert "<=>" in sql
+        params = list(compilado.params.values())
+        assert 12 in params and 3 in params
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Tests: recomendar_basado_en_contenido
@@ -384,19 +664,18 @@ class TestBuscarPorPerfil:
 class TestRecomendarBasadoEnContenido:
     """Tests de integración (con DB mock) para la recomendación por contenido."""
 
-    @pytest.mark.asyncio
     async def test_sin_interacciones_cae_en_populares(self, usuario_sin_historial):
         """
         Usuario sin interacciones → recomendar_populares como fallback.
         Populares necesita 2 consultas a DB (interacciones + eventos).
         """
         user = usuario_sin_historial
-        # 1ª execute: IDs de interacciones del usuario (vacío)
+        # 1ª execute: historial agregado por tipo del usuario (vacío)
         # 2ª execute: interacciones globales para populares (vacío)
         # 3ª execute: eventos próximos para completar populares
         evento_popular = make_event(titulo="Obra popular")
         db = make_async_db(
-            _make_db_result([]),           # ids_interactuados
+            _make_db_result([]),           # historial
             _make_db_result([]),           # populares: interacciones
             _make_db_result([evento_popular]),  # populares: eventos futuros
         )
@@ -410,20 +689,16 @@ class TestRecomendarBasadoEnContenido:
             assert "event" in resultado[0]
             assert "razon" in resultado[0]
 
-    @pytest.mark.asyncio
     async def test_con_historial_sin_embeddings_cae_en_populares(self, usuario_musica):
         """
         Interacciones presentes pero ningún evento tiene embedding → populares.
         """
         user = usuario_musica
-        event_id = _uuid()
-        # Fila de la query de IDs interactuados
-        fila_id = MagicMock()
-        fila_id.event_id = event_id
+        # Fila del historial cuyo evento no tiene embedding
+        fila = (InteractionType.VISTA, [_uuid()], None, 0)
 
         db = make_async_db(
-            _make_db_result([fila_id]),   # ids_interactuados
-            _make_db_result([]),          # calcular_perfil: sin embeddings
+            _make_db_result([fila]),      # historial: sin embeddings
             _make_db_result([]),          # populares: interacciones globales
             _make_db_result([]),          # populares: eventos futuros (vacío)
         )
@@ -433,32 +708,29 @@ class TestRecomendarBasadoEnContenido:
 
         assert isinstance(resultado, list)
 
-    @pytest.mark.asyncio
-    async def test_retorna_eventos_similares_con_historial(self, usuario_teatro):
+    async def test_retorna_eventos_similares_con_historial(
+        self, usuario_teatro, cat_teatro
+    ):
         """
         Usuario con historial e interacciones con embeddings → eventos similares.
         """
         user = usuario_teatro
-        event_id = _uuid()
-        fila_id = MagicMock()
-        fila_id.event_id = event_id
-
         emb_base = _emb(seed=10)
-        cat_teatro = make_category("Teatro")
         eventos_similares = [
-            make_event(titulo=f"Obra {i}", embedding=_emb(i + 11), categoria=cat_teatro)
-            for i in range(5)
+            make_event(titulo=f"Obra {i}", embedding=emb, categoria=cat_teatro)
+            for i, emb in enumerate(_emb_batch(5, inicio=11))
         ]
 
         db = make_async_db(
-            _make_db_result([fila_id]),              # ids_interactuados
-            _make_db_result([(InteractionType.GUARDADO, emb_base)]),  # perfil
+            _make_db_result([(InteractionType.GUARDADO, [_uuid()], emb_base, 1)]),  # historial
             _make_db_result(eventos_similares),      # buscar_por_perfil
         )
         service = RecommenderService(db)
 
         resultado = await service.recomendar_basado_en_contenido(str(user.id), limite=5)
 
+        # Historial + búsqueda por perfil: dos round-trips a la base
+        assert db.execute.await_count == 2
         assert isinstance(resultado, list)
         assert len(resultado) <= 5
         for item in resultado:
@@ -466,28 +738,105 @@ class TestRecomendarBasadoEnContenido:
             assert "razon" in item
             assert item["razon"] == "Basado en tus intereses recientes"
 
-    @pytest.mark.asyncio
-    async def test_diversificacion_limita_por_categoria(self, usuario_teatro):
+    @pytest.mark.parametrize(
+        "invalidar, consultas",
+        [
+            pytest.param(False, 3, id="perfil-cacheado"),
+            pytest.param(True, 4, id="invalidado-tras-interaccion"),
+        ],
+    )
+    async def test_cache_de_perfil(
+        self, invalidar, consultas, usuario_teatro, cat_teatro
+    ):
+        """
+        La segunda llamada reutiliza IDs y perfil sin reagregar el historial,
+        salvo que una interacción nueva haya invalidado la entrada.
+        """
+        historial = _make_db_result(
+            [(InteractionType.GUARDADO, [_uuid()], _emb(seed=12), 1)]
+        )
+        candidatos = _make_db_result([make_event(titulo="Obra", categoria=cat_teatro)])
+        db = make_async_db(
+            historial, candidatos, *((historial,) if invalidar else ()), candidatos
+        )
+        service = RecommenderService(db)
+
+        await service.recomendar_basado_en_contenido(str(usuario_teatro.id), limite=5)
+        if invalidar:
+            invalidar_perfil(usuario_teatro.id)
+        resultado = await service.recomendar_basado_en_contenido(
+            str(usuario_teatro.id), limite=5
+        )
+
+        assert db.execute.await_count == consultas
+        assert resultado[0]["event"]["titulo"] == "Obra"
+
+    async def test_base_caida_sirve_ultimo_resultado_bueno(
+        self, usuario_teatro, cat_teatro
+    ):
+        """Si la base falla, se devuelve el último resultado para los mismos argumentos."""
+        db = make_async_db(
+            _make_db_result([(InteractionType.GUARDADO, [_uuid()], _emb(seed=13), 1)]),
+            _make_db_result([make_event(titulo="Obra", categoria=cat_teatro)]),
+        )
+        bueno = await RecommenderService(db).recomendar_basado_en_contenido(
+            str(usuario_teatro.id), limite=5
+        )
+
+        caida = make_async_db()
+        caida.execute.side_effect = OperationalError("SELECT", {}, TimeoutError())
+        resultado = await RecommenderService(caida).recomendar_basado_en_contenido(
+            str(usuario_teatro.id), limite=5
+        )
+
+        assert resultado == bueno
+        assert resultado[0]["event"]["titulo"] == "Obra"
+
+    async def test_respaldo_normaliza_el_user_id(self, usuario_teatro, cat_teatro):
+        """El mismo UUID en otra capitalización reutiliza el respaldo guardado."""
+        db = make_async_db(
+            _make_db_result([(InteractionType.GUARDADO, [_uuid()], _emb(seed=14), 1)]),
+            _make_db_result([make_event(titulo="Obra", categoria=cat_teatro)]),
+        )
+        bueno = await RecommenderService(db).recomendar_basado_en_contenido(
+            str(usuario_teatro.id), limite=5
+        )
+
+        caida = make_async_db()
+        caida.execute.side_effect = OperationalError("SELECT", {}, TimeoutError())
+        resultado = await RecommenderService(caida).recomendar_basado_en_contenido(
+            str(usuario_teatro.id).upper(), limite=5
+        )
+
+        assert resultado == bueno
+
+    async def test_base_caida_sin_respaldo_propaga_error(self, usuario_teatro):
+        """Sin un resultado previo guardado, el error de la base se propaga."""
+        caida = make_async_db()
+        caida.execute.side_effect = OperationalError("SELECT", {}, TimeoutError())
+
+        with pytest.raises(OperationalError):
+            await RecommenderService(caida).recomendar_basado_en_contenido(
+                str(usuario_teatro.id), limite=5
+            )
+
+    async def test_diversificacion_limita_por_categoria(
+        self, usuario_teatro, cat_teatro
+    ):
         """
         Con muchos eventos de la misma categoría, la diversificación
         no permite más de 3 de la misma.
         """
         user = usuario_teatro
-        event_id = _uuid()
-        fila_id = MagicMock()
-        fila_id.event_id = event_id
-
         emb_base = _emb(seed=20)
-        cat_unica = make_category("Teatro")
         # 6 eventos de la misma categoría
         candidatos = [
-            make_event(titulo=f"Obra {i}", embedding=_emb(i), categoria=cat_unica)
-            for i in range(6)
+            make_event(titulo=f"Obra {i}", embedding=emb, categoria=cat_teatro)
+            for i, emb in enumerate(_emb_batch(6))
         ]
 
         db = make_async_db(
-            _make_db_result([fila_id]),
-            _make_db_result([(InteractionType.VISTA, emb_base)]),
+            _make_db_result([(InteractionType.VISTA, [_uuid()], emb_base, 1)]),
             _make_db_result(candidatos),
         )
         service = RecommenderService(db)
@@ -496,30 +845,30 @@ class TestRecomendarBasadoEnContenido:
 
         assert len(resultado) <= 3  # max_por_categoria=3
 
-    @pytest.mark.asyncio
     async def test_respeta_limite(self, usuario_teatro):
         """El resultado no excede el límite solicitado."""
         user = usuario_teatro
-        fila_id = MagicMock()
-        fila_id.event_id = _uuid()
-
         emb_base = _emb(seed=30)
         categorias = [make_category(f"Cat{i}") for i in range(10)]
         candidatos = [
-            make_event(titulo=f"Evento {i}", embedding=_emb(i), categoria=categorias[i])
-            for i in range(10)
+            make_event(titulo=f"Evento {i}", embedding=emb, categoria=categorias[i])
+            for i, emb in enumerate(_emb_batch(10))
         ]
 
         db = make_async_db(
-            _make_db_result([fila_id]),
-            _make_db_result([(InteractionType.CLIC, emb_base)]),
+            _make_db_result([(InteractionType.CLIC, [_uuid()], emb_base, 1)]),
             _make_db_result(candidatos),
         )
         service = RecommenderService(db)
+        buscar = AsyncMock(wraps=service.buscar_por_perfil)
+        service.buscar_por_perfil = buscar
 
         resultado = await service.recomendar_basado_en_contenido(str(user.id), limite=4)
 
         assert len(resultado) <= 4
+        # La base devuelve solo el top-K con margen 3× para diversificar
+        assert buscar.await_args.kwargs["limite"] == 12
+        assert buscar.await_args.kwargs["max_por_categoria"] == 3
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -527,6 +876,23 @@ class TestRecomendarBasadoEnContenido:
 # ─────────────────────────────────────────────────────────────────────────────
 
 
+# Campos constantes de un evento serializado. Las secuencias vacías son
+# tuplas para que todas las copias compartan el mismo objeto inmutable.
+_EVENT_TEMPLATE: dict[str, Any] = {
+    "descripcion": None,
+    "subcategorias": (),
+    "fecha_inicio": None,
+    "fecha_fin": None,
+    "venue": None,
+    "precio_min": None,
+    "precio_max": None,
+    "es_gratuito": False,
+    "imagen_url": None,
+    "url_fuente": None,
+    "tags": (),
+}
+
+
 class TestRecomendarHibrido:
     """Tests para la combinación Fase 1 + Fase 2."""
 
@@ -548,25 +914,14 @@ class TestRecomendarHibrido:
     def _make_rec(self, event_id: str, categoria: str = "Teatro") -> dict:
         return {
             "event": {
+                **_EVENT_TEMPLATE,
                 "id": event_id,
                 "titulo": f"Evento {event_id[:8]}",
                 "categoria": categoria,
-                "descripcion": None,
-                "subcategorias": [],
-                "fecha_inicio": None,
-                "fecha_fin": None,
-                "venue": None,
-                "precio_min": None,
-                "precio_max": None,
-                "es_gratuito": False,
-                "imagen_url": None,
-                "url_fuente": None,
-                "tags": [],
             },
             "razon": "Razón de prueba",
         }
 
-    @pytest.mark.asyncio
     async def test_combina_resultados_sin_duplicados(self, usuario_hibrido):
         """
         Los resultados de Fase 1 y Fase 2 se combinan eliminando duplicados.
@@ -596,7 +951,6 @@ class TestRecomendarHibrido:
         # El evento compartido aparece exactamente una vez
         assert ids_resultado.count(id_compartido) == 1
 
-    @pytest.mark.asyncio
     async def test_respeta_limite_final(self, usuario_hibrido):
         """El resultado no excede el límite solicitado."""
         explicitas = [self._make_rec(str(_uuid()), f"Cat{i}") for i in range(5)]
@@ -609,7 +963,6 @@ class TestRecomendarHibrido:
 
         assert len(resultado) <= 6
 
-    @pytest.mark.asyncio
     async def test_prioriza_resultados_explicitos(self, usuario_hibrido):
         """
         Los resultados explícitos (Fase 1) aparecen antes que los de contenido.
@@ -628,7 +981,6 @@ class TestRecomendarHibrido:
         ids = [r["event"]["id"] for r in resultado]
         assert ids.index(id_explicito) < ids.index(id_contenido)
 
-    @pytest.mark.asyncio
     async def test_diversificacion_final_por_categoria(self, usuario_hibrido):
         """
         La diversificación final limita a 3 eventos por categoría en el resultado.
@@ -646,7 +998,6 @@ class TestRecomendarHibrido:
         cats = [r["event"]["categoria"] for r in resultado]
         assert cats.count(cat) <= 3
 
-    @pytest.mark.asyncio
     async def test_usuario_solo_con_preferencias_explicitas(self, usuario_teatro):
         """
         Usuario con preferencias pero sin historial implícito:
@@ -663,7 +1014,6 @@ class TestRecomendarHibrido:
         assert len(resultado) >= 1
         assert all("event" in r for r in resultado)
 
-    @pytest.mark.asyncio
     async def test_usuario_solo_con_historial_implicito(self, usuario_musica):
         """
         Usuario sin preferencias explícitas: Fase 1 cae en populares,
@@ -679,7 +1029,6 @@ class TestRecomendarHibrido:
 
         assert len(resultado) >= 1
 
-    @pytest.mark.asyncio
     async def test_resultado_vacio_si_ambas_fases_vacias(self, usuario_sin_historial):
         """Si ambas fases no retornan nada, el resultado es lista vacía."""
         db = AsyncMock()
@@ -691,7 +1040,6 @@ class TestRecomendarHibrido:
 
         assert resultado == []
 
-    @pytest.mark.asyncio
     async def test_formato_resultado(self, usuario_hibrido):
         """Cada elemento del resultado tiene las claves 'event' y 'razon'."""
         explicitas = [self._make_rec(str(_uuid()), "Teatro")]
@@ -707,31 +1055,148 @@ class TestRecomendarHibrido:
             assert "razon" in item
             assert "id" in item["event"]
 
+    async def test_session_factory_ejecuta_fase_2_en_sesion_propia(
+        self, usuario_hibrido, monkeypatch
+    ):
+        """
+        Con session_factory, la Fase 2 corre en paralelo sobre una sesión
+        nueva (una AsyncSession no admite consultas concurrentes).
+        """
+        id_explicito = str(_uuid())
+        id_contenido = str(_uuid())
+        db_contenido = AsyncMock(spec=AsyncSession)
+        fabrica = MagicMock()
+        fabrica.return_value.__aenter__.return_value = db_contenido
+        rec_contenido = self._make_rec(id_contenido, "Cine")
+        sesiones_fase_2: list[Any] = []
+
+        async def _contenido(self, user_id: str, limite: int = 10) -> list[dict]:
+            sesiones_fase_2.append(self.db)
+            return [rec_contenido]
+
+        monkeypatch.setattr(
+            RecommenderService, "recomendar_basado_en_contenido", _contenido
+        )
+        service = RecommenderService(make_async_db(), session_factory=fabrica)
+        service.recomendar_para_usuario = AsyncMock(
+            return_value=[self._make_rec(id_explicito, "Teatro")]
+        )
+
+        resultado = await service.recomendar_hibrido(str(usuario_hibrido.id), limite=10)
+
+        assert sesiones_fase_2 == [db_contenido]
+        assert [r["event"]["id"] for r in resultado] == [id_explicito, id_contenido]
+
+    async def test_sin_sesiones_extra_libres_corre_en_secuencia(
+        self, usuario_hibrido, monkeypatch
+    ):
+        """
+        Con todos los permisos de sesiones extra tomados, no se abre otra
+        sesión: ambas fases usan la del pedido.
+        """
+        monkeypatch.setattr(
+            "app.services.recommender._SESIONES_EXTRA", asyncio.Semaphore(0)
+        )
+        fabrica = MagicMock()
+        db = make_async_db()
+        service = RecommenderService(db, session_factory=fabrica)
+        service.recomendar_para_usuario = AsyncMock(
+            return_value=[self._make_rec(str(_uuid()), "Teatro")]
+        )
+        service.recomendar_basado_en_contenido = AsyncMock(
+            return_value=[self._make_rec(str(_uuid()), "Cine")]
+        )
+
+        resultado = await service.recomendar_hibrido(str(usuario_hibrido.id), limite=10)
+
+        fabrica.assert_not_called()
+        assert len(resultado) == 2
+
 
 # ─────────────────────────────────────────────────────────────────────────────
-# Tests: pesos _PESOS_CONTENIDO (contrato de la constante)
+# Tests: entradas degeneradas (sin round-trip a la base)
 # ─────────────────────────────────────────────────────────────────────────────
 
 
-class TestPesosContenido:
-    """Verifica el contrato de los pesos de interacción."""
+class TestEntradasDegeneradas:
+    """Con limite <= 0 o filtros imposibles, no se consulta la base."""
+
+    @pytest.mark.parametrize(
+        "metodo, args",
+        [
+            pytest.param("recomendar_para_usuario", (str(_uuid()),), id="para_usuario"),
+            pytest.param("recomendar_similares", (str(_uuid()),), id="similares"),
+            pytest.param("recomendar_populares", (), id="populares"),
+            pytest.param(
+                "recomendar_basado_en_contenido", (str(_uuid()),), id="contenido"
+            ),
+            pytest.param("recomendar_hibrido", (str(_uuid()),), id="hibrido"),
+        ],
+    )
+    @pytest.mark.parametrize("limite", [0, -1])
+    async def test_limite_no_positivo_no_consulta(self, metodo, args, limite):
+        db = make_async_db(_make_db_result([]))
+        service = RecommenderService(db)
+
+        resultado = await getattr(service, metodo)(*args, limite=limite)
+
+        assert resultado == []
+        db.execute.assert_not_awaited()
+        db.stream.assert_not_awaited()
+
+    @pytest.mark.parametrize(
+        "query",
+        [
+            pytest.param("hoy", id="hoy"),
+            pytest.param("esta noche", id="noche"),
+        ],
+    )
+    async def test_franja_ya_terminada_no_consulta(self, query, congelar_reloj):
+        """Si la franja pedida ya terminó, se responde [] sin ir a la base."""
+        # Medio segundo antes de la medianoche: "hoy" cerró a las 23:59:59 y
+        # "esta noche" a las 23:59.
+        congelar_reloj(datetime(2024, 6, 12, 23, 59, 59, 500000, tzinfo=timezone.utc))
+        db = make_async_db(_make_db_result([fila_evento(make_event())]))
+        service = RecommenderService(db)
+
+        resultado = await service.recomendar_por_contexto({"query": query})
+
+        assert resultado == []
+        db.execute.assert_not_awaited()
 
-    def test_guardado_tiene_mayor_peso_que_clic(self):
-        assert _PESOS_CONTENIDO[InteractionType.GUARDADO] > _PESOS_CONTENIDO[InteractionType.CLIC]
 
-    def test_clic_tiene_mayor_peso_que_vista(self):
-        assert _PESOS_CONTENIDO[InteractionType.CLIC] > _PESOS_CONTENIDO[InteractionType.VISTA]
+# ─────────────────────────────────────────────────────────────────────────────
+# Tests: pesos _PESOS_CONTENIDO (contrato de la constante)
+# ─────────────────────────────────────────────────────────────────────────────
 
-    def test_asistio_tiene_peso_igual_a_guardado(self):
-        assert _PESOS_CONTENIDO[InteractionType.ASISTIO] == _PESOS_CONTENIDO[InteractionType.GUARDADO]
 
-    def test_todos_los_tipos_de_interaccion_estan_definidos(self):
-        for tipo in InteractionType:
-            assert tipo in _PESOS_CONTENIDO, f"Falta peso para {tipo}"
+class TestPesosContenido:
+    """Verifica el contrato de los pesos de interacción."""
 
-    def test_todos_los_pesos_son_positivos(self):
-        for tipo, peso in _PESOS_CONTENIDO.items():
-            assert peso > 0, f"Peso de {tipo} debe ser positivo"
+    @pytest.mark.parametrize(
+        ("a", "comparar", "b"),
+        [
+            pytest.param(
+                InteractionType.GUARDADO, operator.gt, InteractionType.CLIC,
+                id="guardado_mayor_que_clic",
+            ),
+            pytest.param(
+                InteractionType.CLIC, operator.gt, InteractionType.VISTA,
+                id="clic_mayor_que_vista",
+            ),
+            pytest.param(
+                InteractionType.ASISTIO, operator.eq, InteractionType.GUARDADO,
+                id="asistio_igual_a_guardado",
+            ),
+        ],
+    )
+    def test_pesos_relativos(self, a, comparar, b):
+        assert comparar(_PESOS_CONTENIDO[a], _PESOS_CONTENIDO[b])
+
+    @pytest.mark.parametrize("tipo", list(InteractionType), ids=lambda t: t.value)
+    def test_cada_tipo_tiene_peso_positivo(self, tipo):
+        assert tipo in _PESOS_CONTENIDO, f"Falta peso para {tipo}"
+        assert _PESOS_CONTENIDO[tipo] > 0, f"Peso de {tipo} debe ser positivo"
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -742,7 +1207,6 @@ class TestPesosContenido:
 class TestRecomendarPopulares:
     """Tests para la recomendación basada en popularidad."""
 
-    @pytest.mark.asyncio
     async def test_sin_interacciones_devuelve_eventos_futuros(self):
         """
         Sin interacciones en la DB, completa con próximos eventos.
@@ -762,7 +1226,6 @@ class TestRecomendarPopulares:
             assert "event" in resultado[0]
             assert "razon" in resultado[0]
 
-    @pytest.mark.asyncio
     async def test_razon_es_descripcion_correcta(self):
         """La razón de recomendación popular describe la comunidad."""
         evento = make_event(titulo="Obra popular")
@@ -777,7 +1240,6 @@ class TestRecomendarPopulares:
         if resultado:
             assert "popular" in resultado[0]["razon"].lower()
 
-    @pytest.mark.asyncio
     async def test_limite_respetado(self):
         """No devuelve más eventos que el límite solicitado."""
         eventos = [make_event(titulo=f"Evento {i}") for i in range(20)]
@@ -791,7 +1253,6 @@ class TestRecomendarPopulares:
 
         assert len(resultado) <= 3
 
-    @pytest.mark.asyncio
     async def test_con_interacciones_pondera_guardados(self):
         """
         Eventos con más guardados aparecen primero.
@@ -800,10 +1261,7 @@ class TestRecomendarPopulares:
         event_id = _uuid()
 
         # Fila de interacción: (event_id, tipo, n)
-        fila = MagicMock()
-        fila.event_id = event_id
-        fila.tipo = InteractionType.GUARDADO
-        fila.n = 5
+        fila = _FakeFilaPopularidad(event_id=event_id, tipo=InteractionType.GUARDADO, n=5)
 
         evento_popular = make_event(titulo="El más guardado")
         evento_popular.id = event_id
@@ -818,7 +1276,31 @@ class TestRecomendarPopulares:
 
         assert isinstance(resultado, list)
 
-    @pytest.mark.asyncio
+    async def test_interacciones_se_leen_por_cursor_en_lotes(self):
+        """La agregación de popularidad se consume con db.stream y yield_per."""
+        db = make_async_db(_make_db_result([]))
+        service = RecommenderService(db)
+
+        await service.recomendar_populares(limite=5)
+
+        consulta = db.stream.await_args.args[0]
+        assert consulta.get_execution_options()["yield_per"] > 0
+
+    @pytest.mark.parametrize(
+        "k, esperados",
+        [
+            pytest.param(2, {1, 3}, id="particion"),
+            pytest.param(5, {0, 1, 2, 3, 4}, id="k-igual-a-n"),
+            pytest.param(9, {0, 1, 2, 3, 4}, id="k-mayor-que-n"),
+            pytest.param(0, set(), id="k-cero"),
+        ],
+    )
+    def test_indices_top_k(self, k, esperados):
+        """Selecciona los k puntajes más altos sin ordenar todo el arreglo."""
+        puntajes = np.array([1.0, 9.0, 0.5, 7.0, 3.0])
+
+        assert set(_indices_top_k(puntajes, k).tolist()) == esperados
+
     async def test_lista_vacia_cuando_no_hay_eventos(self):
         """Sin eventos en la DB, retorna lista vacía."""
         db = make_async_db(
@@ -840,7 +1322,6 @@ class TestRecomendarPopulares:
 class TestRecomendarSimilares:
     """Tests para la recomendación de eventos similares a uno dado."""
 
-    @pytest.mark.asyncio
     async def test_evento_inexistente_retorna_lista_vacia(self):
         """Si el evento base no existe en la DB, retorna []."""
         db = make_async_db(_make_db_result([]))  # get_evento retorna None
@@ -850,19 +1331,17 @@ class TestRecomendarSimilares:
 
         assert resultado == []
 
-    @pytest.mark.asyncio
-    async def test_retorna_eventos_similares(self):
+    async def test_retorna_eventos_similares(self, cat_teatro):
         """Con evento base existente, devuelve candidatos similares."""
-        cat = make_category("Teatro")
-        evento_base = make_event(titulo="Obra base", embedding=_emb(0), categoria=cat)
+        evento_base = make_event(titulo="Obra base", embedding=_emb(0), categoria=cat_teatro)
         candidatos = [
-            make_event(titulo=f"Similar {i}", embedding=_emb(i + 1), categoria=cat)
-            for i in range(3)
+            make_event(titulo=f"Similar {i}", embedding=emb, categoria=cat_teatro)
+            for i, emb in enumerate(_emb_batch(3, inicio=1))
         ]
 
         db = make_async_db(
             _make_db_result([evento_base]),  # get_evento
-            _make_db_result(candidatos),     # candidatos similares
+            _make_db_result([fila_evento(e) for e in candidatos]),
         )
         service = RecommenderService(db)
 
@@ -874,17 +1353,15 @@ class TestRecomendarSimilares:
             assert "event" in item
             assert "razon" in item
 
-    @pytest.mark.asyncio
-    async def test_razon_menciona_evento_base(self):
+    async def test_razon_menciona_evento_base(self, cat_cine):
         """La razón de cada resultado menciona el evento de referencia."""
-        cat = make_category("Cine")
         titulo_base = "La Gran Película"
-        evento_base = make_event(titulo=titulo_base, embedding=_emb(0), categoria=cat)
-        candidato = make_event(titulo="Otra película", embedding=_emb(1), categoria=cat)
+        evento_base = make_event(titulo=titulo_base, embedding=_emb(0), categoria=cat_cine)
+        candidato = make_event(titulo="Otra película", embedding=_emb(1), categoria=cat_cine)
 
         db = make_async_db(
             _make_db_result([evento_base]),
-            _make_db_result([candidato]),
+            _make_db_result([fila_evento(candidato)]),
         )
         service = RecommenderService(db)
 
@@ -893,7 +1370,6 @@ class TestRecomendarSimilares:
         if resultado:
             assert titulo_base[:40] in resultado[0]["razon"] or "Similar" in resultado[0]["razon"]
 
-    @pytest.mark.asyncio
     async def test_sin_candidatos_retorna_lista_vacia(self):
         """Si no hay eventos similares, retorna lista vacía."""
         cat = make_category("Danza")
@@ -909,36 +1385,52 @@ class TestRecomendarSimilares:
 
         assert resultado == []
 
-    @pytest.mark.asyncio
-    async def test_limite_respetado(self):
-        """No devuelve más eventos que el límite solicitado."""
-        cat = make_category("Música")
-        evento_base = make_event(titulo="Base", embedding=_emb(0), categoria=cat)
-        candidatos = [
-            make_event(titulo=f"Candidato {i}", embedding=_emb(i + 1), categoria=cat)
-            for i in range(10)
+    async def test_limite_respetado(self, cat_musica):
+        """
+        El top-K se resuelve en la base (ORDER BY <=> LIMIT k): la consulta
+        lleva el límite y el servicio devuelve las K filas ya rankeadas.
+        """
+        evento_base = make_event(titulo="Base", embedding=_emb(0), categoria=cat_musica)
+        # La DB honra el LIMIT: solo devuelve los 3 más cercanos
+        top_k = [
+            make_event(titulo=f"Candidato {i}", embedding=emb, categoria=cat_musica)
+            for i, emb in enumerate(_emb_batch(3, inicio=1))
         ]
 
         db = make_async_db(
             _make_db_result([evento_base]),
-            _make_db_result(candidatos),
+            _make_db_result([fila_evento(e) for e in top_k]),
         )
         service = RecommenderService(db)
 
         resultado = await service.recomendar_similares(str(evento_base.id), limite=3)
 
-        assert len(resultado) <= 3
+        consulta = db.execute.await_args_list[1].args[0].compile(
+            dialect=postgresql.dialect()
+        )
+        assert "<=>" in str(consulta)
+        assert 3 in consulta.params.values()
+        assert [r["event"]["titulo"] for r in resultado] == [
+            "Candidato 0", "Candidato 1", "Candidato 2"
+        ]
+
+    def test_fila_serializa_igual_que_entidad(self, cat_teatro):
+        """Las filas Core producen el mismo dict que la entidad ORM."""
+        evento = make_event(titulo="Obra", categoria=cat_teatro, precio_min=1500.0)
+        service = RecommenderService(make_async_db())
 
-    @pytest.mark.asyncio
-    async def test_evento_sin_embedding_no_falla(self):
+        assert service._serializar_fila(fila_evento(evento)) == (
+            service._serializar_evento(evento)
+        )
+
+    async def test_evento_sin_embedding_no_falla(self, cat_teatro):
         """Evento base sin embedding funciona (ordena por fecha)."""
-        cat = make_category("Teatro")
-        evento_base = make_event(titulo="Sin embedding", embedding=None, categoria=cat)
-        candidato = make_event(titulo="Candidato", embedding=None, categoria=cat)
+        evento_base = make_event(titulo="Sin embedding", embedding=None, categoria=cat_teatro)
+        candidato = make_event(titulo="Candidato", embedding=None, categoria=cat_teatro)
 
         db = make_async_db(
             _make_db_result([evento_base]),
-            _make_db_result([candidato]),
+            _make_db_result([fila_evento(candidato)]),
         )
         service = RecommenderService(db)
 
@@ -955,7 +1447,6 @@ class TestRecomendarSimilares:
 class TestRecomendarParaUsuario:
     """Tests para la recomendación personalizada por preferencias explícitas."""
 
-    @pytest.mark.asyncio
     async def test_usuario_nuevo_sin_historial_cae_en_populares(
         self, usuario_sin_historial
     ):
@@ -976,7 +1467,6 @@ class TestRecomendarParaUsuario:
 
         assert isinstance(resultado, list)
 
-    @pytest.mark.asyncio
     async def test_usuario_inexistente_retorna_lista_vacia(self):
         """Usuario no encontrado en la DB → retorna []."""
         db = make_async_db(_make_db_result([]))  # get_user retorna None
@@ -986,16 +1476,13 @@ class TestRecomendarParaUsuario:
 
         assert resultado == []
 
-    @pytest.mark.asyncio
     async def test_usuario_con_preferencias_recibe_eventos_de_categoria(
-        self, usuario_teatro
+        self, usuario_teatro, cat_teatro
     ):
         """
         Usuario con categoría favorita 'teatro' recibe eventos de esa categoría.
         """
-        cat_teatro = make_category("teatro")
         evento_teatro = make_event(titulo="Obra de teatro", categoria=cat_teatro)
-        evento_teatro.categoria.nombre = "teatro"
 
         db = make_async_db(
             _make_db_result([usuario_teatro]),   # get_user
@@ -1012,14 +1499,9 @@ class TestRecomendarParaUsuario:
             assert "event" in resultado[0]
             assert "razon" in resultado[0]
 
-    @pytest.mark.asyncio
-    async def test_razon_menciona_preferencias(self, usuario_teatro):
+    async def test_razon_menciona_preferencias(self, usuario_teatro, cat_teatro):
         """La razón incluye información sobre las preferencias del usuario."""
-        cat = make_category("teatro")
-        evento = make_event(titulo="Comedia", categoria=cat)
-
-        # Ajustar nombre para que el filtro de categoría lo reconozca
-        evento.categoria.nombre = "teatro"
+        evento = make_event(titulo="Comedia", categoria=cat_teatro)
 
         db = make_async_db(
             _make_db_result([usuario_teatro]),
@@ -1033,7 +1515,31 @@ class TestRecomendarParaUsuario:
             # La razón debe mencionar que es por preferencias
             assert len(resultado[0]["razon"]) > 0
 
-    @pytest.mark.asyncio
+    async def test_ordena_por_puntaje_y_conserva_orden_en_empates(
+        self, usuario_teatro, cat_teatro, cat_cine
+    ):
+        """
+        Mayor puntaje primero (teatro en San Telmo supera a cine en Palermo);
+        a igual puntaje se mantiene el orden de la consulta.
+        """
+        cine_1 = make_event(titulo="Cine 1", categoria=cat_cine)
+        cine_2 = make_event(titulo="Cine 2", categoria=cat_cine)
+        teatro = make_event(
+            titulo="Teatro",
+            categoria=cat_teatro,
+            venue=make_venue("San Telmo"),
+        )
+
+        db = make_async_db(
+            _make_db_result([usuario_teatro]),
+            _make_db_result([cine_1, cine_2, teatro]),
+        )
+        service = RecommenderService(db)
+
+        resultado = await service.recomendar_para_usuario(str(usuario_teatro.id))
+
+        assert [r["event"]["titulo"] for r in resultado] == ["Teatro", "Cine 1", "Cine 2"]
+
     async def test_sin_candidatos_cae_en_populares(self, usuario_teatro):
         """
         Sin candidatos de las categorías favoritas → fallback a populares.
@@ -1052,18 +1558,16 @@ class TestRecomendarParaUsuario:
 
         assert isinstance(resultado, list)
 
-    @pytest.mark.asyncio
-    async def test_diversificacion_no_supera_max_por_categoria(self, usuario_hibrido):
+    async def test_diversificacion_no_supera_max_por_categoria(
+        self, usuario_hibrido, cat_cine
+    ):
         """
         Con muchos eventos de la misma categoría, no se supera max_por_categoria=3.
         """
-        cat_unica = make_category("cine")
         eventos = [
-            make_event(titulo=f"Film {i}", categoria=cat_unica)
+            make_event(titulo=f"Film {i}", categoria=cat_cine)
             for i in range(10)
         ]
-        for e in eventos:
-            e.categoria.nombre = "cine"
 
         db = make_async_db(
             _make_db_result([usuario_hibrido]),
@@ -1076,6 +1580,68 @@ class TestRecomendarParaUsuario:
         # Máximo 3 por categoría
         assert len(resultado) <= 3
 
+    async def test_razones_iguales_comparten_el_mismo_texto(
+        self, usuario_teatro, cat_teatro
+    ):
+        """Eventos con los mismos motivos reciben el mismo objeto str de razón."""
+        eventos = [
+            make_event(titulo=f"Obra {i}", categoria=cat_teatro) for i in range(3)
+        ]
+        db = make_async_db(
+            _make_db_result([usuario_teatro]),
+            _make_db_result(eventos),
+        )
+        service = RecommenderService(db)
+
+        resultado = await service.recomendar_para_usuario(
+            str(usuario_teatro.id), limite=5
+        )
+
+        primera = resultado[0]["razon"]
+        assert "Teatro" in primera
+        assert all(item["razon"] is primera for item in resultado)
+
+    async def test_preferencias_cacheadas_evitan_releer_usuario(
+        self, usuario_teatro, cat_teatro
+    ):
+        """La segunda llamada no vuelve a consultar el usuario a la DB."""
+        evento = make_event(titulo="Obra", categoria=cat_teatro)
+        db = make_async_db(
+            _make_db_result([usuario_teatro]),  # get_user
+            _make_db_result([evento]),          # candidatos filtrados
+        )
+        service = RecommenderService(db)
+
+        await service.recomendar_para_usuario(str(usuario_teatro.id), limite=5)
+        resultado = await service.recomendar_para_usuario(
+            str(usuario_teatro.id), limite=5
+        )
+
+        assert db.execute.await_count == 3
+        assert resultado[0]["event"]["titulo"] == "Obra"
+
+    async def test_invalidar_preferencias_fuerza_relectura(
+        self, usuario_teatro, cat_teatro
+    ):
+        """Tras invalidar, el usuario se vuelve a leer de la DB."""
+        evento = make_event(titulo="Obra", categoria=cat_teatro)
+        db = make_async_db(
+            _make_db_result([usuario_teatro]),
+            _make_db_result([evento]),
+            _make_db_result([usuario_teatro]),
+            _make_db_result([evento]),
+        )
+        service = RecommenderService(db)
+
+        await service.recomendar_para_usuario(str(usuario_teatro.id), limite=5)
+        invalidar_preferencias(usuario_teatro.id)
+        resultado = await service.recomendar_para_usuario(
+            str(usuario_teatro.id), limite=5
+        )
+
+        assert db.execute.await_count == 4
+        assert resultado[0]["event"]["titulo"] == "Obra"
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Tests: recomendar_por_contexto
@@ -1085,22 +1651,20 @@ class TestRecomendarParaUsuario:
 class TestRecomendarPorContexto:
     """Tests para recomendaciones contextuales sin autenticación."""
 
-    @pytest.mark.asyncio
     async def test_sin_filtros_devuelve_eventos_futuros(self):
         """Sin filtros, devuelve eventos próximos."""
         evento = make_event(titulo="Próximo evento")
-        db = make_async_db(_make_db_result([evento]))
+        db = make_async_db(_make_db_result([fila_evento(evento)]))
         service = RecommenderService(db)
 
         resultado = await service.recomendar_por_contexto({})
 
         assert isinstance(resultado, list)
 
-    @pytest.mark.asyncio
     async def test_filtro_gratis_por_bool(self):
         """Contexto con gratis=True filtra solo gratuitos."""
         evento = make_event(titulo="Gratis", es_gratuito=True)
-        db = make_async_db(_make_db_result([evento]))
+        db = make_async_db(_make_db_result([fila_evento(evento)]))
         service = RecommenderService(db)
 
         resultado = await service.recomendar_por_contexto({"gratis": True})
@@ -1109,7 +1673,6 @@ class TestRecomendarPorContexto:
         # El mock devuelve lo que le configuramos; verificamos que no falla
         assert db.execute.called
 
-    @pytest.mark.asyncio
     async def test_filtro_gratis_por_query_text(self):
         """Contexto con query='gratis' activa el filtro de gratuidad."""
         db = make_async_db(_make_db_result([]))
@@ -1120,7 +1683,6 @@ class TestRecomendarPorContexto:
         assert isinstance(resultado, list)
         assert db.execute.called
 
-    @pytest.mark.asyncio
     async def test_filtro_con_ninos(self):
         """Contexto con query='con niños' filtra eventos familiares."""
         db = make_async_db(_make_db_result([]))
@@ -1130,7 +1692,6 @@ class TestRecomendarPorContexto:
 
         assert isinstance(resultado, list)
 
-    @pytest.mark.asyncio
     async def test_filtro_esta_noche(self):
         """Contexto 'esta noche' filtra eventos de hoy de 19:00 a 23:59."""
         db = make_async_db(_make_db_result([]))
@@ -1140,7 +1701,6 @@ class TestRecomendarPorContexto:
 
         assert isinstance(resultado, list)
 
-    @pytest.mark.asyncio
     async def test_filtro_hoy(self):
         """Contexto 'hoy' filtra eventos del día de hoy."""
         db = make_async_db(_make_db_result([]))
@@ -1150,7 +1710,6 @@ class TestRecomendarPorContexto:
 
         assert isinstance(resultado, list)
 
-    @pytest.mark.asyncio
     async def test_filtro_fin_de_semana(self):
         """Contexto 'fin de semana' filtra eventos del próximo sábado y domingo."""
         db = make_async_db(_make_db_result([]))
@@ -1160,22 +1719,74 @@ class TestRecomendarPorContexto:
 
         assert isinstance(resultado, list)
 
-    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "query, esperadas",
+        [
+            pytest.param(
+                "Gratis con niños esta noche",
+                ("evento gratuito", "apto para niños y familia", "esta noche"),
+                id="combinadas",
+            ),
+            pytest.param("hoy a la noche", ("esta noche",), id="noche-antes-que-hoy"),
+            pytest.param(
+                "plan familiar finde",
+                ("apto para niños", "fin de semana"),
+                id="familiar-finde",
+            ),
+        ],
+    )
+    async def test_palabras_clave_en_una_pasada(self, query, esperadas, congelar_reloj):
+        """Todas las palabras clave de la consulta se reflejan en la razón."""
+        # Miércoles al mediodía: ni "hoy" ni "esta noche" terminaron todavía.
+        congelar_reloj(datetime(2024, 6, 12, 12, 0, tzinfo=timezone.utc))
+        db = make_async_db(_make_db_result([fila_evento(make_event())]))
+        service = RecommenderService(db)
+
+        resultado = await service.recomendar_por_contexto({"query": query})
+
+        for esperada in esperadas:
+            assert esperada in resultado[0]["razon"]
+
+    @pytest.mark.parametrize(
+        "hoy, sabado",
+        [
+            pytest.param(date(2024, 6, 12), date(2024, 6, 15), id="miercoles"),
+            pytest.param(date(2024, 6, 15), date(2024, 6, 22), id="sabado-pasa-al-siguiente"),
+            pytest.param(date(2024, 6, 16), date(2024, 6, 22), id="domingo"),
+        ],
+    )
+    def test_rangos_del_dia(self, hoy, sabado):
+        """Los límites precalculados dependen solo de la fecha."""
+        utc = timezone.utc
+        rangos = _rangos_del_dia(hoy)
+
+        assert rangos["noche"] == (
+            datetime.combine(hoy, time(19, 0), tzinfo=utc),
+            datetime.combine(hoy, time(23, 59), tzinfo=utc),
+        )
+        assert rangos["hoy"] == (
+            datetime.combine(hoy, time(0, 0), tzinfo=utc),
+            datetime.combine(hoy, time(23, 59, 59), tzinfo=utc),
+        )
+        assert rangos["finde"] == (
+            datetime.combine(sabado, time(0, 0), tzinfo=utc),
+            datetime.combine(sabado + timedelta(days=1), time(23, 59, 59), tzinfo=utc),
+        )
+
     async def test_filtro_barrio(self):
         """Contexto con barrio hace JOIN con Venue."""
         evento = make_event(titulo="En Palermo")
-        db = make_async_db(_make_db_result([evento]))
+        db = make_async_db(_make_db_result([fila_evento(evento)]))
         service = RecommenderService(db)
 
         resultado = await service.recomendar_por_contexto({"barrio": "Palermo"})
 
         assert isinstance(resultado, list)
 
-    @pytest.mark.asyncio
     async def test_razon_menciona_contexto(self):
         """La razón de recomendación describe el contexto aplicado."""
         evento = make_event(titulo="Gratis hoy")
-        db = make_async_db(_make_db_result([evento]))
+        db = make_async_db(_make_db_result([fila_evento(evento)]))
         service = RecommenderService(db)
 
         resultado = await service.recomendar_por_contexto({"gratis": True})
@@ -1184,10 +1795,9 @@ class TestRecomendarPorContexto:
             # La razón debe ser informativa
             assert len(resultado[0]["razon"]) > 0
 
-    @pytest.mark.asyncio
     async def test_sin_contexto_razon_generica(self):
         """Sin filtros la razón es genérica."""
-        db = make_async_db(_make_db_result([make_event()]))
+        db = make_async_db(_make_db_result([fila_evento(make_event())]))
         service = RecommenderService(db)
 
         resultado = await service.recomendar_por_contexto({})
@@ -1195,7 +1805,6 @@ class TestRecomendarPorContexto:
         if resultado:
             assert "Buenos Aires" in resultado[0]["razon"] or len(resultado[0]["razon"]) > 0
 
-    @pytest.mark.asyncio
     async def test_contexto_vacio_no_falla(self):
         """Contexto vacío no lanza excepciones."""
         db = make_async_db(_make_db_result([]))
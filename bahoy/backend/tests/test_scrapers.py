@@ -18,9 +18,8 @@ Ejecutar:
 
 from __future__ import annotations
 
-import hashlib
+import re
 from datetime import datetime
-from unittest.mock import MagicMock
 
 import pytest
 
@@ -30,39 +29,76 @@ from app.scrapers.items import EventItem, clean_text, generate_event_hash
 # Importar el spider
 from app.scrapers.agenda_ba_spider import AgendaBaSpider
 
+# Respuestas HTTP reales de Scrapy; opcionales para los tests con HTML
+try:
+    from scrapy.http import HtmlResponse, Request
+
+    HAS_SCRAPY = True
+    # Ningún test inspecciona el request: todas las respuestas comparten uno
+    _REQUEST_COMPARTIDO = Request("https://turismo.buenosaires.gob.ar/es/evento/test")
+except ImportError:
+    HAS_SCRAPY = False
+
+# Se evalúa al colectar: sin Scrapy los tests ni siquiera arman sus fixtures
+requiere_scrapy = pytest.mark.skipif(
+    not HAS_SCRAPY, reason="Scrapy no disponible en este entorno"
+)
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Helpers para crear respuestas HTTP falsas
 # ─────────────────────────────────────────────────────────────────────────────
 
 
-def _make_response(html: str, url: str = "https://turismo.buenosaires.gob.ar/es/evento/test") -> MagicMock:
+# Cualquier tag HTML; compilado una vez para todas las aserciones
+_PATRON_TAG = re.compile(r"<[^>]+>")
+
+
+def _assert_sin_html(texto: str) -> None:
+    """Falla si ``texto`` conserva algún tag HTML."""
+    assert not _PATRON_TAG.search(texto), f"Quedaron tags en {texto!r}"
+
+
+class _SelectorFijo:
+    """Resultado de ``response.css(...)`` con un valor fijo."""
+
+    __slots__ = ("_valor",)
+
+    def __init__(self, valor: str | None):
+        self._valor = valor
+
+    def get(self) -> str | None:
+        return self._valor
+
+    def getall(self) -> list[str]:
+        return [] if self._valor is None else [self._valor]
+
+
+class _RespuestaCss:
+    """Response mínima: todo ``css(selector)`` devuelve el mismo selector."""
+
+    __slots__ = ("_sel",)
+
+    def __init__(self, texto: str | None):
+        self._sel = _SelectorFijo(texto)
+
+    def css(self, _selector: str) -> _SelectorFijo:
+        return self._sel
+
+
+class _RespuestaPorSelector:
     """
-    Crea un mock de scrapy.http.Response con el HTML dado.
-    Simula los métodos css() y urljoin().
+    Response mínima que resuelve cada ``css(selector)`` en un dict fijo.
+    Un selector desconocido levanta KeyError: fija qué consulta el spider.
     """
-    try:
-        from scrapy.http import HtmlResponse, Request
-        request = Request(url=url)
-        return HtmlResponse(
-            url=url,
-            body=html.encode("utf-8"),
-            request=request,
-        )
-    except Exception:
-        # Fallback: mock manual si Scrapy no está disponible en el entorno de test
-        resp = MagicMock()
-        resp.url = url
 
-        def css_side_effect(selector):
-            mock_sel = MagicMock()
-            mock_sel.get.return_value = None
-            mock_sel.getall.return_value = []
-            return mock_sel
+    __slots__ = ("_selectores",)
+
+    def __init__(self, selectores: dict[str, _SelectorFijo]):
+        self._selectores = selectores
 
-        resp.css.side_effect = css_side_effect
-        resp.urljoin.side_effect = lambda href: href
-        return resp
+    def css(self, selector: str) -> _SelectorFijo:
+        return self._selectores[selector]
 
 
 # HTML de ejemplo para un evento de Agenda Buenos Aires
@@ -114,18 +150,73 @@ EVENTO_HTML_SIN_TITULO = """
 </html>
 """
 
+# Cuerpos ya codificados: HtmlResponse recibe bytes
+EVENTO_HTML_COMPLETO_BYTES = EVENTO_HTML_COMPLETO.encode("utf-8")
+EVENTO_HTML_GRATUITO_BYTES = EVENTO_HTML_GRATUITO.encode("utf-8")
+EVENTO_HTML_SIN_TITULO_BYTES = EVENTO_HTML_SIN_TITULO.encode("utf-8")
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Fixture: instancia del spider
 # ─────────────────────────────────────────────────────────────────────────────
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def spider():
-    """Instancia de AgendaBaSpider lista para usar en tests."""
+    """
+    Instancia de AgendaBaSpider compartida por el módulo.
+
+    Los tests sólo llaman métodos puros (parse_date, extract_*, parse_event);
+    los contadores events_scraped/errors que parse_event incrementa no se
+    verifican en ningún test, así que construir el spider una sola vez es
+    seguro.
+    """
     return AgendaBaSpider()
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# Fixtures: respuestas HTML reales (una por módulo)
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+def _html_response(body: bytes, url: str):
+    """
+    HtmlResponse real de Scrapy (sólo para tests marcados con requiere_scrapy).
+
+    Accede a ``selector`` para que lxml parsee el documento durante el setup
+    del fixture; Scrapy lo cachea en la respuesta y todos los ``css()`` de
+    los tests reutilizan ese árbol.
+    """
+    respuesta = HtmlResponse(url=url, body=body, request=_REQUEST_COMPARTIDO)
+    # Fuerza el parseo lxml ahora, durante el setup del fixture.
+    _ = respuesta.selector
+    return respuesta
+
+
+@pytest.fixture(scope="module")
+def respuesta_completo():
+    """Respuesta con EVENTO_HTML_COMPLETO; el árbol lxml se parsea una sola vez."""
+    return _html_response(
+        EVENTO_HTML_COMPLETO_BYTES, "https://turismo.buenosaires.gob.ar/es/evento/test"
+    )
+
+
+@pytest.fixture(scope="module")
+def respuesta_gratuito():
+    """Respuesta con EVENTO_HTML_GRATUITO."""
+    return _html_response(
+        EVENTO_HTML_GRATUITO_BYTES, "https://turismo.buenosaires.gob.ar/evento/gratis"
+    )
+
+
+@pytest.fixture(scope="module")
+def respuesta_sin_titulo():
+    """Respuesta con EVENTO_HTML_SIN_TITULO."""
+    return _html_response(
+        EVENTO_HTML_SIN_TITULO_BYTES, "https://turismo.buenosaires.gob.ar/evento/sin-titulo"
+    )
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Tests: clean_text
 # ─────────────────────────────────────────────────────────────────────────────
@@ -136,8 +227,7 @@ class TestCleanText:
 
     def test_elimina_tags_html(self):
         result = clean_text("<b>Texto</b> con <em>HTML</em>")
-        assert "<b>" not in result
-        assert "<em>" not in result
+        _assert_sin_html(result)
         assert "Texto" in result
         assert "HTML" in result
 
@@ -162,6 +252,7 @@ class TestCleanText:
 
     def test_combina_html_y_espacios(self):
         result = clean_text("<p>  Festival   de   Arte  </p>")
+        _assert_sin_html(result)
         assert result == "Festival de Arte"
 
 
@@ -186,19 +277,18 @@ class TestGenerateEventHash:
         h2 = generate_event_hash("Hamlet", "2025-03-15", "Teatro Cervantes")
         assert h1 == h2
 
-    def test_diferente_titulo_produce_diferente_hash(self):
-        h1 = generate_event_hash("Hamlet", "2025-03-15", "Teatro Cervantes")
-        h2 = generate_event_hash("Romeo y Julieta", "2025-03-15", "Teatro Cervantes")
-        assert h1 != h2
-
-    def test_diferente_fecha_produce_diferente_hash(self):
-        h1 = generate_event_hash("Hamlet", "2025-03-15", "Teatro Cervantes")
-        h2 = generate_event_hash("Hamlet", "2025-04-10", "Teatro Cervantes")
-        assert h1 != h2
-
-    def test_diferente_venue_produce_diferente_hash(self):
+    @pytest.mark.parametrize(
+        "titulo,fecha,venue",
+        [
+            pytest.param("Romeo y Julieta", "2025-03-15", "Teatro Cervantes", id="titulo"),
+            pytest.param("Hamlet", "2025-04-10", "Teatro Cervantes", id="fecha"),
+            pytest.param("Hamlet", "2025-03-15", "Teatro San Martín", id="venue"),
+        ],
+    )
+    def test_diferente_campo_produce_diferente_hash(self, titulo, fecha, venue):
+        """Cambiar título, fecha o venue cambia el hash."""
         h1 = generate_event_hash("Hamlet", "2025-03-15", "Teatro Cervantes")
-        h2 = generate_event_hash("Hamlet", "2025-03-15", "Teatro San Martín")
+        h2 = generate_event_hash(titulo, fecha, venue)
         assert h1 != h2
 
     def test_normaliza_mayusculas_en_titulo(self):
@@ -207,6 +297,12 @@ class TestGenerateEventHash:
         h2 = generate_event_hash("hamlet", "2025-03-15", "Teatro Cervantes")
         assert h1 == h2
 
+    def test_normaliza_mayusculas_en_venue(self):
+        """El hash es insensible a mayúsculas en el venue."""
+        h1 = generate_event_hash("Hamlet", "2025-03-15", "TEATRO CERVANTES")
+        h2 = generate_event_hash("Hamlet", "2025-03-15", "teatro cervantes")
+        assert h1 == h2
+
     def test_venue_vacio_no_falla(self):
         """Venue vacío no lanza excepción."""
         h = generate_event_hash("Hamlet", "2025-03-15", "")
@@ -218,15 +314,26 @@ class TestGenerateEventHash:
         h = generate_event_hash("Hamlet", "2025-03-15", None)
         assert isinstance(h, str)
 
-    def test_hash_es_md5(self):
-        """Verifica que el algoritmo sea MD5."""
-        titulo = "test"
-        fecha = "2025-01-01"
-        venue = "lugar"
-        expected = hashlib.md5(
-            f"{titulo}|{fecha}|{venue}".encode("utf-8")
-        ).hexdigest()
-        assert generate_event_hash(titulo, fecha, venue) == expected
+    @pytest.mark.parametrize(
+        "titulo,fecha,venue,esperado",
+        [
+            pytest.param(
+                "test", "2025-01-01", "lugar",
+                "d495dc04cfe730523f3a7e4e4432c121", id="basico",
+            ),
+            pytest.param(
+                "Hamlet ", "2025-03-15", "Teatro Cervantes",
+                "0890678c4ccf02ca3ac17cc5add9a963", id="normaliza",
+            ),
+            pytest.param(
+                "Hamlet", "2025-03-15", None,
+                "fdda0283c2181ff03531c17f042ae224", id="sin-venue",
+            ),
+        ],
+    )
+    def test_hash_es_md5(self, titulo, fecha, venue, esperado):
+        """Verifica que el algoritmo sea MD5 de 'titulo|fecha|venue' normalizado."""
+        assert generate_event_hash(titulo, fecha, venue) == esperado
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -252,17 +359,25 @@ class TestParseFecha:
         assert result.hour == 21
         assert result.minute == 0
 
-    def test_todos_los_meses_en_espanol(self, spider):
-        """Verifica que todos los meses en español sean reconocidos."""
-        meses = [
-            ("enero", 1), ("febrero", 2), ("marzo", 3), ("abril", 4),
-            ("mayo", 5), ("junio", 6), ("julio", 7), ("agosto", 8),
-            ("septiembre", 9), ("octubre", 10), ("noviembre", 11), ("diciembre", 12),
-        ]
-        for nombre_mes, numero in meses:
-            result = spider.parse_date(f"10 de {nombre_mes} de 2025")
-            assert result is not None, f"Mes '{nombre_mes}' no fue parseado"
-            assert result.month == numero, f"Mes incorrecto para '{nombre_mes}'"
+    @pytest.mark.parametrize(
+        "nombre_mes,numero",
+        [
+            pytest.param(nombre, numero, id=nombre)
+            for numero, nombre in enumerate(
+                (
+                    "enero", "febrero", "marzo", "abril", "mayo", "junio",
+                    "julio", "agosto", "septiembre", "octubre", "noviembre",
+                    "diciembre",
+                ),
+                start=1,
+            )
+        ],
+    )
+    def test_todos_los_meses_en_espanol(self, spider, nombre_mes, numero):
+        """Cada mes en español se reconoce; un caso por mes para aislar fallas."""
+        result = spider.parse_date(f"10 de {nombre_mes} de 2025")
+        assert result is not None, f"Mes '{nombre_mes}' no fue parseado"
+        assert result.month == numero, f"Mes incorrecto para '{nombre_mes}'"
 
     def test_formato_sin_anio_usa_anio_actual(self, spider):
         """Sin año explícito, usa el año actual."""
@@ -299,46 +414,35 @@ class TestParseFecha:
 class TestExtractPrice:
     """Tests para la extracción de información de precios."""
 
-    def _make_price_response(self, price_text: str) -> MagicMock:
-        """Mock de response con un precio específico."""
-        resp = MagicMock()
-        sel = MagicMock()
-        sel.get.return_value = price_text
-        resp.css.return_value = sel
-        return resp
-
     def test_precio_numerico(self, spider):
         """'$3000' → price=3000.0, is_free=False."""
-        resp = self._make_price_response("$3000")
+        resp = _RespuestaCss("$3000")
         result = spider.extract_price(resp)
         assert result["is_free"] is False
         assert result["price"] == pytest.approx(3000.0)
 
     def test_precio_gratis(self, spider):
         """'Gratis' → is_free=True."""
-        resp = self._make_price_response("Gratis")
+        resp = _RespuestaCss("Gratis")
         result = spider.extract_price(resp)
         assert result["is_free"] is True
 
     def test_precio_gratuito(self, spider):
         """'Gratuito' → is_free=True."""
-        resp = self._make_price_response("Gratuito")
+        resp = _RespuestaCss("Gratuito")
         result = spider.extract_price(resp)
         assert result["is_free"] is True
 
     def test_sin_precio_retorna_none(self, spider):
         """Sin texto de precio, price=None."""
-        resp = MagicMock()
-        sel = MagicMock()
-        sel.get.return_value = None
-        resp.css.return_value = sel
+        resp = _RespuestaCss(None)
         result = spider.extract_price(resp)
         assert result["price"] is None
         assert result["is_free"] is False
 
     def test_precio_con_decimales(self, spider):
         """'$1.500' → price=1500.0."""
-        resp = self._make_price_response("$1.500")
+        resp = _RespuestaCss("$1.500")
         result = spider.extract_price(resp)
         # El regex extrae el primer número → 1 en este caso puede variar
         # Solo verificamos que no lanza excepción
@@ -346,7 +450,7 @@ class TestExtractPrice:
 
     def test_precio_con_coma(self, spider):
         """'$2.500,50' → price parseable."""
-        resp = self._make_price_response("$2.500,50")
+        resp = _RespuestaCss("$2.500,50")
         result = spider.extract_price(resp)
         assert result is not None
 
@@ -356,49 +460,50 @@ class TestExtractPrice:
 # ─────────────────────────────────────────────────────────────────────────────
 
 
+# Selectores que extract_category recorre cuando no encuentra categoría
+_CSS_SIN_CATEGORIA = {
+    ".event-category::text": _SelectorFijo(None),
+    ".categoria::text": _SelectorFijo(None),
+    ".breadcrumb a::text": _SelectorFijo(None),
+}
+
+
 class TestExtractCategory:
     """Tests para el mapeo de categorías."""
 
-    def _make_category_response(self, category_text: str) -> MagicMock:
-        resp = MagicMock()
-        sel = MagicMock()
-        sel.get.return_value = category_text
-        resp.css.return_value = sel
-        return resp
-
     def test_mapeo_musica(self, spider):
         """'musica' mapea a 'music'."""
-        resp = self._make_category_response("musica")
+        resp = _RespuestaCss("musica")
         assert spider.extract_category(resp) == "music"
 
     def test_mapeo_teatro(self, spider):
         """'teatro' mapea a 'theater'."""
-        resp = self._make_category_response("teatro")
+        resp = _RespuestaCss("teatro")
         assert spider.extract_category(resp) == "theater"
 
     def test_mapeo_cine(self, spider):
         """'cine' mapea a 'cinema'."""
-        resp = self._make_category_response("cine")
+        resp = _RespuestaCss("cine")
         assert spider.extract_category(resp) == "cinema"
 
     def test_mapeo_danza(self, spider):
         """'danza' mapea a 'dance'."""
-        resp = self._make_category_response("danza")
+        resp = _RespuestaCss("danza")
         assert spider.extract_category(resp) == "dance"
 
     def test_mapeo_tango(self, spider):
         """'tango' mapea a 'tango'."""
-        resp = self._make_category_response("tango")
+        resp = _RespuestaCss("tango")
         assert spider.extract_category(resp) == "tango"
 
     def test_mapeo_recital_a_music(self, spider):
         """'recital' y 'concierto' mapean a 'music'."""
-        resp = self._make_category_response("recital")
+        resp = _RespuestaCss("recital")
         assert spider.extract_category(resp) == "music"
 
     def test_categoria_desconocida_retorna_other(self, spider):
         """Categoría desconocida retorna 'other'."""
-        resp = self._make_category_response("deportes extremos")
+        resp = _RespuestaCss("deportes extremos")
         # Si no hay match, debería retornar 'other'
         # (si no hay match en CATEGORY_MAPPING)
         result = spider.extract_category(resp)
@@ -406,15 +511,7 @@ class TestExtractCategory:
 
     def test_sin_categoria_retorna_other(self, spider):
         """Sin CSS match, retorna 'other'."""
-        resp = MagicMock()
-        sel = MagicMock()
-        sel.get.return_value = None
-        getall_sel = MagicMock()
-        getall_sel.getall.return_value = []
-        resp.css.side_effect = lambda selector: (
-            sel if "::text" in selector and "breadcrumb" not in selector
-            else getall_sel
-        )
+        resp = _RespuestaPorSelector(_CSS_SIN_CATEGORIA)
         result = spider.extract_category(resp)
         assert result == "other"
 
@@ -424,90 +521,39 @@ class TestExtractCategory:
 # ─────────────────────────────────────────────────────────────────────────────
 
 
+@requiere_scrapy
 class TestParseEvent:
     """Tests de extracción completa de eventos desde HTML."""
 
-    def test_extrae_titulo_del_html(self, spider):
+    def test_extrae_titulo_del_html(self, spider, respuesta_completo):
         """El título se extrae correctamente del HTML."""
-        response = _make_response(EVENTO_HTML_COMPLETO)
-        if hasattr(response, "css"):
-            # Solo verificamos si tenemos HtmlResponse real
-            result = spider.parse_event(response)
-            if result:
-                assert result["title"] == "Hamlet"
-
-    def test_extrae_titulo_con_h1(self, spider):
+        result = spider.parse_event(respuesta_completo)
+        assert result["title"] == "Hamlet"
+
+    def test_extrae_titulo_con_h1(self, spider, respuesta_gratuito):
         """Título extraído del selector h1.event-title."""
-        try:
-            from scrapy.http import HtmlResponse, Request
-            html = '<html><body><h1 class="event-title">Mi Evento</h1></body></html>'
-            request = Request("https://turismo.buenosaires.gob.ar/evento/test")
-            response = HtmlResponse(
-                url="https://turismo.buenosaires.gob.ar/evento/test",
-                body=html.encode("utf-8"),
-                request=request,
-            )
-            titulo = spider.extract_title(response)
-            assert titulo == "Mi Evento"
-        except ImportError:
-            pytest.skip("Scrapy no disponible en este entorno")
+        titulo = spider.extract_title(respuesta_gratuito)
+        assert titulo == "Festival de Jazz en el Parque"
 
-    def test_extrae_descripcion(self, spider):
+    def test_extrae_descripcion(self, spider, respuesta_completo):
         """La descripción se extrae del elemento .event-description."""
-        try:
-            from scrapy.http import HtmlResponse, Request
-            html = (
-                '<html><body>'
-                '<h1 class="event-title">Evento</h1>'
-                '<div class="event-description">Descripción del evento</div>'
-                '</body></html>'
-            )
-            request = Request("https://turismo.buenosaires.gob.ar/evento/test")
-            response = HtmlResponse(
-                url="https://turismo.buenosaires.gob.ar/evento/test",
-                body=html.encode("utf-8"),
-                request=request,
-            )
-            desc = spider.extract_description(response)
-            assert "Descripción" in desc
-        except ImportError:
-            pytest.skip("Scrapy no disponible en este entorno")
+        desc = spider.extract_description(respuesta_completo)
+        assert "obra teatral" in desc
 
-    def test_event_sin_titulo_retorna_none(self, spider):
+    def test_event_sin_titulo_retorna_none(self, spider, respuesta_sin_titulo):
         """Un evento sin título retorna None."""
-        try:
-            from scrapy.http import HtmlResponse, Request
-            request = Request("https://turismo.buenosaires.gob.ar/evento/sin-titulo")
-            response = HtmlResponse(
-                url="https://turismo.buenosaires.gob.ar/evento/sin-titulo",
-                body=EVENTO_HTML_SIN_TITULO.encode("utf-8"),
-                request=request,
-            )
-            result = spider.parse_event(response)
-            assert result is None
-        except ImportError:
-            pytest.skip("Scrapy no disponible en este entorno")
+        result = spider.parse_event(respuesta_sin_titulo)
+        assert result is None
+
+    def test_extrae_precio_numerico(self, spider, respuesta_completo):
+        """'$3000' en el HTML completo → price=3000.0, is_free=False."""
+        price_info = spider.extract_price(respuesta_completo)
+        assert price_info == {"price": pytest.approx(3000.0), "is_free": False}
 
-    def test_extrae_precio_gratis(self, spider):
+    def test_extrae_precio_gratis(self, spider, respuesta_gratuito):
         """Evento gratuito: is_free=True."""
-        try:
-            from scrapy.http import HtmlResponse, Request
-            html = (
-                '<html><body>'
-                '<h1 class="event-title">Festival</h1>'
-                '<div class="event-price">Gratis</div>'
-                '</body></html>'
-            )
-            request = Request("https://turismo.buenosaires.gob.ar/evento/gratis")
-            response = HtmlResponse(
-                url="https://turismo.buenosaires.gob.ar/evento/gratis",
-                body=html.encode("utf-8"),
-                request=request,
-            )
-            price_info = spider.extract_price(response)
-            assert price_info["is_free"] is True
-        except ImportError:
-            pytest.skip("Scrapy no disponible en este entorno")
+        price_info = spider.extract_price(respuesta_gratuito)
+        assert price_info["is_free"] is True
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -518,28 +564,6 @@ class TestParseEvent:
 class TestDeduplicacion:
     """Verifica que el mecanismo de deduplicación por hash funciona."""
 
-    def test_mismo_evento_produce_mismo_hash(self):
-        """Dos scrapes del mismo evento producen hashes iguales."""
-        titulo = "Hamlet - Teatro Cervantes"
-        fecha = "2025-03-15 21:00:00"
-        venue = "Teatro Cervantes"
-
-        h1 = generate_event_hash(titulo, fecha, venue)
-        h2 = generate_event_hash(titulo, fecha, venue)
-        assert h1 == h2
-
-    def test_variacion_minuscula_mismo_hash(self):
-        """Las variaciones de capitalización producen el mismo hash."""
-        h1 = generate_event_hash("HAMLET", "2025-03-15", "TEATRO CERVANTES")
-        h2 = generate_event_hash("hamlet", "2025-03-15", "teatro cervantes")
-        assert h1 == h2
-
-    def test_diferente_fecha_indica_evento_diferente(self):
-        """El mismo evento en diferente fecha es considerado distinto."""
-        h1 = generate_event_hash("Hamlet", "2025-03-15", "Teatro Cervantes")
-        h2 = generate_event_hash("Hamlet", "2025-04-20", "Teatro Cervantes")
-        assert h1 != h2
-
     def test_hash_resistente_a_espacios_extra(self):
         """Espacios extra en título/venue se normalizan para el hash."""
         h1 = generate_event_hash("Hamlet", "2025-03-15", "Teatro Cervantes")
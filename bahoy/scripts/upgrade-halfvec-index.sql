@@ -0,0 +1,31 @@
+-- ========================================
+-- BAHOY - Reconstruir el índice HNSW sobre halfvec
+-- ========================================
+-- Las consultas de vecinos ordenan por CAST(embedding AS halfvec(384)), así
+-- que el índice tiene que ser de expresión sobre ese mismo cast. Las bases
+-- creadas antes conservan el índice viejo (vector_cosine_ops), que el planner
+-- no puede usar para ese ORDER BY: la búsqueda cae a un scan secuencial.
+-- metadata.create_all no lo reemplaza porque el nombre ya existe.
+--
+-- Ejecutar una vez por base existente:
+--   make upgrade-halfvec-index
+-- La columna embedding no cambia; solo se reconstruye el índice.
+--
+-- NO ejecutar dentro de una transacción (sin BEGIN, sin psql --single-transaction):
+-- CREATE/DROP INDEX CONCURRENTLY lo rechazan. El índice nuevo se construye
+-- aparte sin bloquear escrituras en events; el viejo sigue atendiendo
+-- consultas hasta el final y, si la construcción falla, queda intacto.
+-- Correr con psql -v ON_ERROR_STOP=1 (como hace el target de make) para que
+-- un CREATE fallido corte el script antes del DROP del índice viejo.
+
+-- Restos de una corrida anterior interrumpida (un índice CONCURRENTLY que
+-- falla queda INVALID con su nombre ocupado).
+DROP INDEX CONCURRENTLY IF EXISTS ix_events_embedding_halfvec;
+
+CREATE INDEX CONCURRENTLY ix_events_embedding_halfvec ON events
+  USING hnsw ((embedding::halfvec(384)) halfvec_cosine_ops)
+  WITH (m = 16, ef_construction = 64);
+
+DROP INDEX CONCURRENTLY IF EXISTS ix_events_embedding;
+
+ALTER INDEX ix_events_embedding_halfvec RENAME TO ix_events_embedding;